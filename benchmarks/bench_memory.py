@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Memory held by parsed Image objects.
+
+Compares the previous eager, ``__dict__`` based data objects with the current slotted ones that build ``Tag``
+and ``ImageType`` objects on first access, with and without a client :class:`ObjectRegistry` sharing them.
+
+Run with ``python benchmarks/bench_memory.py``.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from weebapi.data_objects import Image, ObjectRegistry  # noqa: E402
+
+
+class LegacyImageType:
+    def __init__(self, name, client):
+        self.name = name
+        self.client = client
+
+
+class LegacyTag:
+    def __init__(self, tag, client):
+        self.name = tag.get("name", "unknown")
+        self.account = tag.get("user", "unknown")
+        self.is_hidden = tag.get("hidden", False)
+        self.client = client
+
+
+class LegacyImage:
+    def __init__(self, snowflake, image_type, base_type, nsfw, file_type, mime_type, tags, url, hidden, account,
+                 client, source=""):
+        self.client = client
+        self.snowflake = snowflake
+        self.type = LegacyImageType(image_type, self.client)
+        self.base_type = base_type
+        self.nsfw = nsfw
+        self.file_type = file_type
+        self.mime_type = mime_type
+        self.hidden = hidden
+        self.account = account
+        self.source = source
+        self.tags = [LegacyTag(t, self.client) for t in tags]
+        self.url = url
+
+
+def response(i):
+    return {
+        "id": f"r1{i:07d}", "type": "owo", "baseType": "owo", "nsfw": False, "fileType": "png",
+        "mimeType": "image/png", "url": f"https://cdn.weeb.sh/images/r1{i:07d}.png", "hidden": False,
+        "account": "123456789012345678", "source": "",
+        "tags": [{"name": "owo", "hidden": False, "user": "123456789012345678"},
+                 {"name": "cute", "hidden": False, "user": "123456789012345678"},
+                 {"name": "neko", "hidden": False, "user": "123456789012345678"}],
+    }
+
+
+class FakeClient:
+    def __init__(self):
+        self.registry = ObjectRegistry(self)
+
+
+def measure(cls, responses, touch_tags=False, client=None):
+    gc.collect()
+    tracemalloc.start()
+    objects = [cls(r["id"], r["type"], r["baseType"], r["nsfw"], r["fileType"], r["mimeType"], r["tags"],
+                   r["url"], r["hidden"], r["account"], client, source=r["source"]) for r in responses]
+    if touch_tags:
+        for o in objects:
+            o.tags
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(objects)
+
+
+def main(count=100000):
+    # Responses are built up front and kept alive, so only the objects themselves are measured.
+    responses = [response(i) for i in range(count)]
+    print(f"{count} images with 3 tags each")
+    print(f"{'before':>22}: {measure(LegacyImage, responses):7.0f} bytes/image")
+    print(f"{'after, tags untouched':>22}: {measure(Image, responses):7.0f} bytes/image")
+    print(f"{'after, tags accessed':>22}: {measure(Image, responses, touch_tags=True):7.0f} bytes/image")
+    shared = measure(Image, responses, touch_tags=True, client=FakeClient())
+    print(f"{'after, shared tags':>22}: {shared:7.0f} bytes/image")
+
+
+if __name__ == "__main__":
+    main()
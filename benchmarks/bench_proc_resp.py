@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Per-response CPU cost of krequest._proc_resp.
+
+Compares the previous implementation (eager f-string debug logging and aiohttp's ``response.json()``) with the
+current one on a ``/images/tags``-sized payload, with logging at INFO level as in production.
+
+Run with ``python benchmarks/bench_proc_resp.py``.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from weebapi.request_lib import krequest, orjson  # noqa: E402
+
+logger = logging.getLogger()
+logging.basicConfig(level=logging.INFO)
+
+PAYLOAD = json.dumps({
+    "status": 200,
+    "tags": [{"name": f"tag_{i}", "hidden": False, "user": "123456789012345678"} for i in range(5000)],
+}).encode()
+HEADERS = {f"X-Header-{i}": "value" * 4 for i in range(20)}
+
+
+class FakeResponse:
+    method = "GET"
+    url = "https://api.weeb.sh/images/tags"
+    headers = HEADERS
+
+    async def read(self):
+        return PAYLOAD
+
+    async def text(self):
+        return PAYLOAD.decode()
+
+    async def json(self):
+        # aiohttp decodes the body to text first and then runs json.loads on it.
+        return json.loads(PAYLOAD.decode())
+
+
+async def proc_resp_before(response):
+    logger.debug(f"Request {response.method}: {response.url}")
+    logger.debug(f"Response headers: {str(response.headers)}")
+    resp = await response.json()
+    logger.debug(f"Response content: {str(resp)}")
+    return resp
+
+
+async def measure(func, rounds):
+    response = FakeResponse()
+    start = time.process_time()
+    for _ in range(rounds):
+        await func(response)
+    return (time.process_time() - start) / rounds * 1e6
+
+
+async def main(rounds=200):
+    stdlib = krequest(json_loads=json.loads)
+    results = [
+        ("before", await measure(proc_resp_before, rounds)),
+        ("after, json", await measure(stdlib._proc_resp, rounds)),
+    ]
+    if orjson:
+        results.append(("after, orjson", await measure(krequest(json_loads=orjson.loads)._proc_resp, rounds)))
+    print(f"payload: {len(PAYLOAD)} bytes, {rounds} rounds")
+    for name, cost in results:
+        print(f"{name:>14}: {cost:9.1f} us/response")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
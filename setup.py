@@ -34,6 +34,9 @@ setup(
     keywords=['weebapi'],
     include_package_data=True,
     install_requires=get_requirements(),
+    extras_require={
+        'speed': ['orjson'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'License :: OSI Approved :: MIT License',
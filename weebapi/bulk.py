@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+_DONE = object()
+
+
+async def bounded_map(func, items, concurrency: int = 10):
+    """
+    Runs ``func`` over ``items`` with at most ``concurrency`` calls in flight.
+
+    This is an async generator yielding ``(index, item, result)`` tuples as calls complete. If a call raises,
+    the exception takes the place of the result and the remaining items are still processed. Items are
+    pulled from ``items`` lazily, so it may be a large or endless iterator.
+
+    Parameters
+    -----------
+    func:
+        Coroutine function taking one item.
+    items:
+        Iterable of items.
+    concurrency: :class:`int`
+        Maximum amount of concurrent calls.
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1!")
+    source = enumerate(items)
+    queue = asyncio.Queue(maxsize=concurrency)
+
+    failed = []
+
+    async def worker():
+        try:
+            for index, item in source:
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    result = e
+                await queue.put((index, item, result))
+        except Exception as e:
+            # The items iterator itself failed, which ends the whole run.
+            failed.append(e)
+        await queue.put(_DONE)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    running = len(workers)
+    try:
+        while running:
+            entry = await queue.get()
+            if entry is _DONE:
+                running -= 1
+                continue
+            yield entry
+        if failed:
+            raise failed[0]
+    finally:
+        for w in workers:
+            w.cancel()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger()
+
+
+class TTLCache:
+    """
+    Small in-memory cache with stale-while-revalidate semantics.
+
+    Entries younger than ``ttl`` are served directly. Older entries are still served, but a refresh is
+    scheduled in the background. If a refresh fails the last good value stays in place.
+
+    Parameters
+    -----------
+    ttl: :class:`float`
+        Seconds after which an entry is considered stale. ``0`` or ``None`` disables caching.
+    name: :class:`str`
+        Name reported with lookups to ``instrument``.
+    instrument: :class:`weebapi.metrics.Instrument`
+        Receives a ``cache`` event for every lookup.
+    """
+
+    def __init__(self, ttl: float = 300.0, name: str = "ttl", instrument=None):
+        self.ttl = ttl
+        self.name = name
+        self.instrument = instrument
+        self._entries = {}
+        self._refreshing = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.ttl)
+
+    def is_fresh(self, key) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    def peek(self, key, default=None):
+        entry = self._entries.get(key)
+        return default if entry is None else entry[1]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def set(self, key, value, age: float = 0.0):
+        self._entries[key] = (time.monotonic() - age, value)
+
+    def invalidate(self, key=None):
+        """Drops one entry or, if ``key`` is omitted, the whole cache."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def close(self):
+        """Cancels running background refreshes."""
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+
+    async def get_or_fetch(self, key, fetch):
+        """|coro|
+
+        Returns the cached value for ``key``, calling ``fetch()`` if it is missing.
+
+        Parameters
+        -----------
+        key:
+            Any hashable key.
+        fetch:
+            Coroutine function without arguments that produces a fresh value.
+        """
+        if not self.enabled:
+            return await fetch()
+        entry = self._entries.get(key)
+        if self.instrument:
+            self.instrument.emit("cache", cache=self.name, hit=entry is not None)
+        if entry is None:
+            value = await fetch()
+            self.set(key, value)
+            return value
+        if time.monotonic() - entry[0] >= self.ttl and key not in self._refreshing:
+            self._refreshing[key] = asyncio.ensure_future(self._refresh(key, fetch))
+        return entry[1]
+
+    async def _refresh(self, key, fetch):
+        try:
+            self.set(key, await fetch())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WEEB.SH Background refresh of {key!r} failed, serving stale copy: {e!r}")
+        self._refreshing.pop(key, None)
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache.
+
+    Entries are evicted once there are more than ``maxsize`` of them or their total size exceeds
+    ``max_bytes``. The size of an entry is measured with ``sizeof``. With a ``ttl``, entries older than that
+    are dropped when they are looked up.
+
+    Parameters
+    -----------
+    maxsize: :class:`int`
+        Maximum amount of entries. ``None`` means no limit.
+    max_bytes: :class:`int`
+        Maximum total size of all entries. ``None`` means no limit.
+    sizeof:
+        Function returning the size of a value. Defaults to :func:`len`.
+    ttl: :class:`float`
+        Seconds after which an entry expires. ``None`` means entries never expire.
+    name: :class:`str`
+        Name reported with lookups to ``instrument``.
+    instrument: :class:`weebapi.metrics.Instrument`
+        Receives a ``cache`` event for every lookup.
+
+    Attributes
+    -----------
+    hits: :class:`int`
+        Amount of successful lookups.
+    misses: :class:`int`
+        Amount of failed lookups.
+    """
+
+    def __init__(self, maxsize: int = None, max_bytes: int = None, sizeof=len, ttl: float = None, name: str = "lru",
+                 instrument=None):
+        self.name = name
+        self.instrument = instrument
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def get(self, key, default=None):
+        try:
+            value, size, stored_at = self._entries[key]
+            if self.ttl is not None and time.monotonic() - stored_at >= self.ttl:
+                self.invalidate(key)
+                raise KeyError(key)
+        except KeyError:
+            self.misses += 1
+            if self.instrument:
+                self.instrument.emit("cache", cache=self.name, hit=False)
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if self.instrument:
+            self.instrument.emit("cache", cache=self.name, hit=True)
+        return value
+
+    def set(self, key, value, age: float = 0.0):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.invalidate(key)
+        self._entries[key] = (value, size, time.monotonic() - age)
+        self.size += size
+        while (self.maxsize is not None and len(self._entries) > self.maxsize) or \
+                (self.max_bytes is not None and self.size > self.max_bytes):
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def invalidate(self, key=None):
+        """Drops one entry or, if ``key`` is omitted, the whole cache."""
+        if key is None:
+            self._entries.clear()
+            self.size = 0
+            return
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
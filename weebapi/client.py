@@ -1,15 +1,28 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import logging
+import os
 
+import aiohttp
+
+from .bulk import bounded_map
+from .cache import LRUCache, TTLCache
 from .data_objects import *
+from .dedup import StreamHasher, UploadIndex
 from .errors import *
 from .img_gen import ImgGen
+from .metrics import Instrument, MetricsRegistry
+from .persistent import PersistentCache
+from .prefetch import PrefetchPool
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 from .request_lib import krequest
 from .router import Router
+from .search import SearchIndex
 
 BASE_URL = "https://api.weeb.sh/"
 BASE_URL_V2 = "https://api-v2.weeb.sh/"
+NEGATIVE_STATUSES = (403, 404)
 logger = logging.getLogger()
 
 
@@ -48,22 +61,150 @@ class Client:
     **bot: Bot or AutoShardedBot
         Your bot client from discord.py
     **loop: asyncio loop
-        Your asyncio loop.
+        *Ignored.* Kept for backwards compatibility, the HTTP session is created on the loop that is running
+        when the first request is made.
+    **pool_size: :class:`int`
+        Maximum amount of simultaneous connections. ``0`` means no limit.
+        **Default:** 100
+    **pool_size_per_host: :class:`int`
+        Maximum amount of simultaneous connections to one host. ``0`` means no limit.
+        **Default:** 0
+    **keepalive_timeout: :class:`float`
+        Seconds for which idle connections are kept open for reuse.
+        **Default:** 30
+    **dns_cache_ttl: :class:`int`
+        Seconds for which resolved DNS entries are cached.
+        **Default:** 300
+    **timeout: :class:`float`
+        Total timeout of one request in seconds. ``None`` means no timeout.
+        **Default:** None
+    **rate_limit: :class:`float`
+        Maximum requests per second across all routes. Rate-limit headers sent by weeb.sh are always
+        followed, this only adds a local limit on top of them.
+        **Default:** None
+    **route_rate_limit: :class:`float`
+        Maximum requests per second for each route.
+        **Default:** None
+    **rate_limit_scope: :class:`str`
+        ``"global"`` if the quota in weeb.sh's rate-limit headers is shared by all routes, so a 429 on one route
+        holds back requests on every route. ``"route"`` if each route has its own quota.
+        **Default:** "global"
+    **retries: :class:`int`
+        How many times idempotent requests are retried after a 5xx response or a connection error,
+        with capped exponential backoff and jitter. Set to ``0`` to disable retrying.
+        **Default:** 3
+    **breaker_threshold: :class:`int`
+        Consecutive failures on one route after which requests to it fail immediately with
+        :class:`weebapi.errors.ServiceUnavailable`. Set to ``0`` to disable the circuit breaker.
+        **Default:** 5
+    **breaker_timeout: :class:`float`
+        Seconds after which a single request is let through to check if the route recovered.
+        **Default:** 30
+    **coalesce: :class:`bool`
+        Identical lookups of images, types, tags and previews that are in flight at the same time share one HTTP
+        request and its result. :meth:`get_random` is never coalesced.
+        **Default:** True
+    **img_gen_cache_bytes: :class:`int`
+        Size in bytes of the cache of generated images. Generating an image with the same inputs again is
+        then served from memory, see ``img_gen.cache.stats()`` for the hit ratio. ``0`` disables it.
+        **Default:** 0
+    **img_gen_in_memory: :class:`bool`
+        Keep generated images in memory instead of writing them to the temporary folder.
+        See :class:`weebapi.data_objects.ImageFile`.
+        **Default:** False
+    **chunk_size: :class:`int`
+        Size in bytes of the chunks in which downloads are streamed.
+        **Default:** 65536
+    **json_loads:
+        Function used to decode JSON responses from :class:`bytes`. Defaults to ``orjson.loads`` if orjson is
+        installed, otherwise :func:`json.loads`.
+    **tracer: :class:`weebapi.tracing.Tracer`
+        Receives a :class:`weebapi.tracing.RequestTrace` with DNS, connect, time-to-first-byte and transfer
+        timings and a correlation ID for every request.
+        **Default:** None
+    **persistent_cache: :class:`str`
+        Path of a SQLite file in which responses of :meth:`get_types`, :meth:`get_tags`, :meth:`get_previews`
+        and :meth:`get_image` are stored. After a restart the caches are filled from it and stale entries are
+        refreshed in the background. Several processes may share one file.
+        **Default:** None
+    **persistent_ttl: :class:`float`
+        Seconds after which entries of the persistent cache are ignored.
+        **Default:** 86400
+    **image_cache_size: :class:`int`
+        Amount of :class:`weebapi.data_objects.Image` objects from :meth:`get_image` kept in memory. Entries are
+        dropped when tags are added or removed or the image is deleted through this client. ``0`` disables it.
+        **Default:** 1024
+    **image_cache_ttl: :class:`float`
+        Seconds for which cached images, including those stored in ``persistent_cache``, are served without a
+        request. Older images on disk are still served but refreshed in the background. ``None`` means until they
+        are evicted or changed.
+        **Default:** 3600
+    **negative_cache_size: :class:`int`
+        Amount of failed lookups remembered. :meth:`get_image` and :meth:`get_random` calls answered with 404 or
+        403, and :meth:`get_preview` calls for types that don't exist, raise the same error again without a
+        request while it is remembered. Server errors and rate limits are never remembered. ``0`` disables it.
+        **Default:** 1024
+    **negative_cache_ttl: :class:`float`
+        Seconds for which a failed lookup is remembered.
+        **Default:** 30
+    **upload_index: :class:`str`
+        Path of a SQLite file in which content hashes of uploaded files are stored. :meth:`upload` then returns
+        the already uploaded image instead of sending the same file again, also after a restart.
+        **Default:** None
+    **conditional_cache_size: :class:`int`
+        Amount of GET responses whose ``ETag``/``Last-Modified`` validators are kept. Refreshing one of them
+        sends ``If-None-Match``/``If-Modified-Since`` and reuses the stored result on ``304 Not Modified``.
+        ``0`` disables conditional requests.
+        **Default:** 256
+    **cache_ttl: :class:`float`
+        Seconds for which results of :meth:`get_types`, :meth:`get_tags` and :meth:`get_previews` are
+        considered fresh.
+        Stale results are still returned while they are refreshed in the background, and kept if the
+        refresh fails. Set to ``0`` to disable caching.
+        **Default:** 300
 
     """
 
     def __init__(self, api_key: str, wolke_token: bool = True, v2_api: bool = False,
-                 base_url: str = BASE_URL, bot=None, loop=asyncio.get_event_loop()):
+                 base_url: str = BASE_URL, bot=None, loop=None, cache_ttl: float = 300.0, pool_size: int = 100,
+                 pool_size_per_host: int = 0, keepalive_timeout: float = 30.0, dns_cache_ttl: int = 300,
+                 timeout: float = None, rate_limit: float = None, route_rate_limit: float = None, retries: int = 3,
+                 breaker_threshold: int = 5, breaker_timeout: float = 30.0, coalesce: bool = True,
+                 img_gen_cache_bytes: int = 0, img_gen_in_memory: bool = False, chunk_size: int = 64 * 1024,
+                 json_loads=None, tracer=None, persistent_cache: str = None, persistent_ttl: float = 86400.0,
+                 conditional_cache_size: int = 256, upload_index: str = None, image_cache_size: int = 1024,
+                 image_cache_ttl: float = 3600.0, negative_cache_size: int = 1024, negative_cache_ttl: float = 30.0,
+                 rate_limit_scope: str = "global"):
         if v2_api is True:
             base_url = BASE_URL_V2
         self.api_key = api_key
-        self._loop = loop
         self.route = Router(base_url)
+        self.instrument = Instrument()
         self.request = krequest(global_headers=[
             ("Authorization", f"Wolke {self.api_key}" if wolke_token else f"Bearer {self.api_key}")
-        ], loop=self._loop)
+        ], limit=pool_size, limit_per_host=pool_size_per_host,
+            keepalive_timeout=keepalive_timeout, ttl_dns_cache=dns_cache_ttl, timeout=timeout, router=self.route,
+            rate_limiter=RateLimiter(rate=rate_limit, route_rate=route_rate_limit, quota_scope=rate_limit_scope),
+            retry_policy=RetryPolicy(retries=retries), breaker_threshold=breaker_threshold,
+            breaker_timeout=breaker_timeout, coalesce=coalesce, chunk_size=chunk_size,
+            json_loads=json_loads, instrument=self.instrument, tracer=tracer,
+            conditional_cache_size=conditional_cache_size)
         self.bot = bot
-        self.img_gen = ImgGen(self)
+        self.registry = ObjectRegistry(self)
+        self.search_index = SearchIndex()
+        self.img_gen = ImgGen(self, cache_bytes=img_gen_cache_bytes, in_memory=img_gen_in_memory)
+        self.persistent_cache = PersistentCache(persistent_cache, ttl=persistent_ttl) if persistent_cache else None
+        self.upload_index = UploadIndex(upload_index) if upload_index else None
+        self._built = {}
+        self.image_cache_ttl = image_cache_ttl
+        self._image_refreshes = {}
+        self._image_generations = {}
+        self.image_cache = LRUCache(maxsize=image_cache_size, ttl=image_cache_ttl, name="image",
+                                    instrument=self.instrument) if image_cache_size else None
+        self.negative_cache = LRUCache(maxsize=negative_cache_size, ttl=negative_cache_ttl, name="negative",
+                                       instrument=self.instrument) if negative_cache_size else None
+        self.metadata_cache = TTLCache(ttl=cache_ttl, name="metadata", instrument=self.instrument)
+        self.prefetch = None
 
         logger_string = str("Wolke " if wolke_token else "Bearer ") + self.api_key[-4:].rjust(len(self.api_key), "*")
         logger.info(f"WEEB.SH Logging in as {logger_string}")
@@ -94,11 +235,89 @@ class Client:
             bot.weebsh = cls(api_key, bot=bot, *args, **kwargs)
             return bot.weebsh
 
+    async def close(self):
+        """|coro|
+
+        Stops prefetching and closes the HTTP session. Call this before your event loop shuts down.
+        """
+        self.disable_prefetch()
+        self.metadata_cache.close()
+        for task in self._image_refreshes.values():
+            task.cancel()
+        self._image_refreshes.clear()
+        await self.request.close()
+        if self.persistent_cache is not None:
+            self.persistent_cache.close()
+        if self.upload_index is not None:
+            self.upload_index.close()
+
+    def enable_metrics(self, registry: MetricsRegistry = None) -> MetricsRegistry:
+        """
+        Starts collecting request and cache metrics.
+
+        Every request is recorded with its :class:`weebapi.router.Route` name, status, latency, bytes received
+        and time spent waiting for the rate limiter. Use ``registry.quantiles(route)`` for p50/p95/p99 latency
+        and ``registry.render()`` for the Prometheus text format.
+
+        For your own instrumentation register a callback with ``client.instrument.add_callback``, see
+        :class:`weebapi.metrics.Instrument`.
+
+        Parameters
+        -----------
+        **registry: :class:`weebapi.metrics.MetricsRegistry`
+            Registry to record into. A new one is created if omitted.
+
+
+        :return: :class:`weebapi.metrics.MetricsRegistry`
+        """
+        registry = registry or MetricsRegistry()
+        self.instrument.add_callback(registry)
+        return registry
+
+    def enable_prefetch(self, depth: int = 10, low_water: int = 3, concurrency: int = 2,
+                        idle_timeout: float = 300.0) -> PrefetchPool:
+        """
+        Enables background prefetching for :meth:`get_random`.
+
+        For every combination of ``tags``, ``image_type``, ``nsfw``, ``hidden`` and ``file_type`` a queue of
+        ready images is kept. Calls are served from that queue and it is refilled in the background.
+
+        Parameters
+        -----------
+        **depth: :class:`int`
+            Maximum amount of images queued per combination. Defaults to 10.
+        **low_water: :class:`int`
+            Refill is started once the queue holds this many images or fewer. Defaults to 3.
+        **concurrency: :class:`int`
+            Maximum amount of background requests in flight. Defaults to 2.
+        **idle_timeout: :class:`float`
+            Seconds after which an unused combination is dropped. Defaults to 300.
+
+
+        :return: :class:`weebapi.prefetch.PrefetchPool` with ``hits``, ``misses`` and ``stats()``.
+        """
+        self.disable_prefetch()
+        self.prefetch = PrefetchPool(self._fetch_random, depth=depth, low_water=low_water,
+                                     concurrency=concurrency, idle_timeout=idle_timeout, instrument=self.instrument)
+        return self.prefetch
+
+    def disable_prefetch(self):
+        """
+        Disables prefetching and drops all queued images.
+        """
+        if self.prefetch is not None:
+            self.prefetch.close()
+            self.prefetch = None
+
     async def get_image(self, image: str or Image) -> Image:
         """|coro|
 
         This function gets image by it's ID.
 
+        Results are kept in ``image_cache``, see the ``image_cache_size`` parameter of :class:`Client`. With a
+        ``persistent_cache``, images stored on disk are served too; once they are older than ``image_cache_ttl``
+        the stored copy is returned and refreshed in the background.
+
         Parameters
         ------------
         image: :class:`str` or :class:`weebapi.data_objects.Image`
@@ -114,8 +333,370 @@ class Client:
             pass
         else:
             raise ValueError
-        g = await self.request.get(self.route.image.format_url(image))
-        return Image.parse(g, self)
+        if self.image_cache is not None:
+            cached = self.image_cache.get(image)
+            if cached is not None:
+                return cached
+        stored = self.persistent_cache.load(("image", image)) if self.persistent_cache is not None else None
+        if stored is None:
+            self._raise_remembered((self.route.image.name, image))
+            generation = self._image_generations.get(image, 0)
+            g = await self.request.get(self.route.image.format_url(image), coalesce=True)
+            return await self._store_image(image, g, generation)
+        age, payload = stored
+        result = Image.parse(payload, self)
+        if self.image_cache_ttl is not None and age >= self.image_cache_ttl:
+            if image not in self._image_refreshes:
+                self._image_refreshes[image] = asyncio.ensure_future(self._refresh_image(image))
+        elif self.image_cache is not None:
+            self.image_cache.set(image, result, age=age)
+        return result
+
+    async def _store_image(self, snowflake: str, g: dict, generation: int) -> Image:
+        """
+        Parses and caches a fetched image, unless it was changed through this client since ``generation`` was
+        read, in which case the response may predate the change and is only returned.
+        """
+        result = self._parse_image(g, (self.route.image.name, snowflake))
+        if self._image_generations.get(snowflake, 0) != generation:
+            return result
+        if self.image_cache is not None:
+            self.image_cache.set(snowflake, result)
+        if self.persistent_cache is not None:
+            await self.persistent_cache.store(("image", snowflake), g)
+            if self._image_generations.get(snowflake, 0) != generation:
+                # Changed while storing; the delete of _forget_image may have run before this write.
+                await self.persistent_cache.delete(("image", snowflake))
+        return result
+
+    async def _refresh_image(self, snowflake: str):
+        generation = self._image_generations.get(snowflake, 0)
+        try:
+            g = await self.request.get(self.route.image.format_url(snowflake), coalesce=True)
+            if int(g.get("status", 200)) in NEGATIVE_STATUSES:
+                # Deleted or hidden elsewhere, for example by another shard.
+                await self._forget_image(snowflake)
+            else:
+                await self._store_image(snowflake, g, generation)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WEEB.SH Background refresh of image {snowflake} failed, serving stale copy: {e!r}")
+        self._image_refreshes.pop(snowflake, None)
+
+    async def iter_images(self, images, concurrency: int = 10):
+        """
+        Gets many images by their IDs, yielding them as they arrive.
+
+        This is an async generator, use it with ``async for``. At most ``concurrency`` requests are in flight at
+        once. Failed lookups don't stop the iteration, the exception is yielded in place of the image.
+
+        .. code-block:: python
+
+            async for snowflake, image in weeb.iter_images(ids, concurrency=20):
+                if isinstance(image, Exception):
+                    ...
+
+        Parameters
+        ------------
+        images:
+            Iterable of image IDs or :class:`weebapi.data_objects.Image` objects.
+        **concurrency: :class:`int`
+            Maximum amount of concurrent requests. Defaults to 10.
+
+
+        :return: Yields ``(snowflake, result)`` tuples, where result is an :class:`weebapi.data_objects.Image`
+            or an exception.
+
+        """
+        async for index, image, result in bounded_map(self.get_image, images, concurrency):
+            yield (image.snowflake if isinstance(image, Image) else image), result
+
+    async def get_images(self, images, concurrency: int = 10) -> list:
+        """|coro|
+
+        Gets many images by their IDs with at most ``concurrency`` requests in flight.
+
+        Parameters
+        ------------
+        images:
+            Iterable of image IDs or :class:`weebapi.data_objects.Image` objects.
+        **concurrency: :class:`int`
+            Maximum amount of concurrent requests. Defaults to 10.
+
+
+        :return: :class:`list` in the same order as ``images``. Each entry is an
+            :class:`weebapi.data_objects.Image` or, if that lookup failed, the exception it raised.
+
+        """
+        results = {}
+        async for index, image, result in bounded_map(self.get_image, images, concurrency):
+            results[index] = result
+        return [results[i] for i in range(len(results))]
+
+    async def iter_tag_edits(self, operations, concurrency: int = 10):
+        """
+        Adds and removes tags on many images, yielding results as images finish.
+
+        This is an async generator, use it with ``async for``. Operations on the same image are merged first, in
+        order, so a tag that is added and later removed again is only removed, and every image gets at most one
+        request per direction. At most ``concurrency`` images are edited at once and a failure doesn't stop the
+        others. Cached metadata of every touched image is dropped.
+
+        .. code-block:: python
+
+            ops = [(image, ["cute"], []), ("rJHE5e1Ub", [], ["old"])]
+            async for snowflake, result in weeb.iter_tag_edits(ops):
+                if isinstance(result, Exception):
+                    ...
+
+        Parameters
+        ------------
+        operations:
+            Iterable of ``(image, add, remove)`` tuples, where ``image`` is an image ID or
+            :class:`weebapi.data_objects.Image` and ``add`` and ``remove`` are lists of tag names.
+        **concurrency: :class:`int`
+            Maximum amount of images edited at once. Defaults to 10.
+
+
+        :return: Yields ``(snowflake, result)`` tuples, where result is an ``(added, removed)`` tuple of the
+            merged tag name lists or an exception.
+
+        """
+        merged = _merge_tag_operations(operations)
+        async for index, (snowflake, _), result in bounded_map(self._edit_tags, merged.items(), concurrency):
+            yield snowflake, result
+
+    async def edit_tags(self, operations, concurrency: int = 10) -> dict:
+        """|coro|
+
+        Adds and removes tags on many images, see :meth:`iter_tag_edits`.
+
+        Parameters
+        ------------
+        operations:
+            Iterable of ``(image, add, remove)`` tuples.
+        **concurrency: :class:`int`
+            Maximum amount of images edited at once. Defaults to 10.
+
+
+        :return: :class:`dict` of snowflakes mapped to an ``(added, removed)`` tuple or, if editing that image
+            failed, the exception it raised.
+
+        """
+        return {snowflake: result async for snowflake, result in self.iter_tag_edits(operations, concurrency)}
+
+    async def _edit_tags(self, item: tuple) -> tuple:
+        snowflake, (add, remove) = item
+        if remove:
+            await self._remove_tags(snowflake, remove)
+        if add:
+            await self._add_tags(snowflake, add)
+        return add, remove
+
+    async def _add_tags(self, snowflake: str, tags: list):
+        try:
+            g = await self.request.post(str(self.route.image_add_tags.format_url(snowflake)), data={
+                "tags": ",".join(tags)
+            })
+        finally:
+            await self._forget_image(snowflake)
+        if g.get("status", 200) != 200:
+            raise Forbidden("You are not allowed to access this resource.")
+
+    async def _remove_tags(self, snowflake: str, tags: list):
+        try:
+            g = await self.request.delete(str(self.route.image_remove_tags.format_url(snowflake)), params={
+                "tags": ",".join(tags)
+            })
+        finally:
+            await self._forget_image(snowflake)
+        if int(g.get("status", 200)) != 200:
+            raise Forbidden("You are not allowed to access this resource.")
+
+    async def _delete_image(self, snowflake: str):
+        try:
+            g = await self.request.delete(str(self.route.image_remove.format_url(snowflake)))
+        finally:
+            await self._forget_image(snowflake)
+        if g.get("status", 200) != 200:
+            raise Forbidden("You are not allowed to access this resource.")
+
+    async def _forget_image(self, snowflake: str):
+        """
+        Drops cached metadata of an image after it was changed.
+
+        Lookups that were already running when this is called don't write their possibly older result back,
+        and new lookups don't join a request that is still in flight.
+        """
+        self._image_generations[snowflake] = self._image_generations.get(snowflake, 0) + 1
+        self.request.forget_inflight(self.route.image.format_url(snowflake))
+        if self.image_cache is not None:
+            self.image_cache.invalidate(snowflake)
+        if self.negative_cache is not None:
+            self.negative_cache.invalidate((self.route.image.name, snowflake))
+        if self.persistent_cache is not None:
+            await self.persistent_cache.delete(("image", snowflake))
+            if self.image_cache is not None:
+                # A lookup may have loaded the old copy from disk before the delete went through.
+                self.image_cache.invalidate(snowflake)
+
+    async def upload(self, file, base_type: str, hidden: bool = False, nsfw: bool = False, tags: list = None,
+                     source: str = None, filename: str = None, content_type: str = None) -> Image:
+        """|coro|
+
+        Uploads an image to weeb.sh.
+
+        The file is streamed as a multipart body and never loaded into memory as a whole. Files given by path
+        are read in chunks in the default executor.
+
+        If the client has an ``upload_index``, the SHA-256 hash of paths, :class:`bytes` and seekable file
+        objects is looked up first and the existing image is returned if the same content was uploaded
+        before. Async iterators can't be checked up front, they are hashed while they are sent and recorded
+        for the next time.
+
+        Parameters
+        -----------
+        file:
+            Path (:class:`str`), :class:`bytes`-like object, binary file object or async iterator of
+            :class:`bytes` chunks.
+        base_type: :class:`str`
+            Image type of the upload.
+        **hidden: :class:`bool`
+            Upload as a private image. Defaults to False.
+        **nsfw: :class:`bool`
+            Mark the image as NSFW. Defaults to False.
+        **tags: :class:`list`
+            List of tag names.
+        **source: :class:`str`
+            Source of the image.
+        **filename: :class:`str`
+            File name sent to weeb.sh. Defaults to the name of the path or ``image``.
+        **content_type: :class:`str`
+            MIME type of the file. Guessed from the file name by aiohttp if omitted.
+
+
+        :return: :class:`weebapi.data_objects.Image` of the uploaded image.
+
+        Raises
+        --------
+        Forbidden:
+            If required permissions are absent.
+        RateLimited:
+            If weeb.sh rate limited the upload. Paths and :class:`bytes` are sent again after the rate limit
+            resets, up to 3 times. File objects and async iterators are not.
+        """
+        path = None
+        if isinstance(file, str):
+            path = file
+            filename = filename or os.path.basename(path)
+        # Paths and bytes can be sent again, streams and file objects are consumed by the first attempt.
+        replayable = path is not None or isinstance(file, (bytes, bytearray, memoryview))
+        hasher = digest = None
+        if self.upload_index is not None:
+            hasher = StreamHasher()
+            if path is not None:
+                with open(path, 'rb') as handle:
+                    digest = await hasher.hash_file(handle)
+            elif isinstance(file, (bytes, bytearray, memoryview)):
+                await hasher.update(file)
+                digest = hasher.hexdigest()
+            elif hasattr(file, "seekable") and file.seekable():
+                digest = await hasher.hash_file(file)
+            elif hasattr(file, "__aiter__"):
+                file = hasher.wrap(file)
+            else:
+                hasher = None
+            if digest is not None:
+                existing = await self._find_upload(digest)
+                if existing is not None:
+                    return existing
+        attempt = 0
+        while True:
+            handle = open(path, 'rb') if path is not None else None
+            try:
+                form = _upload_form(handle or file, base_type, hidden, nsfw, tags, source, filename, content_type)
+                g = await self.request.post_stream(str(self.route.upload), data=form)
+            except RateLimited:
+                if not replayable or attempt >= self.request.rate_limit_retries:
+                    raise
+                attempt += 1
+                logger.info(f"WEEB.SH Upload of {filename or 'image'} was rate limited, retry {attempt}")
+            else:
+                break
+            finally:
+                if handle is not None:
+                    handle.close()
+        status = int(g.get("status", 200))
+        if status == 403:
+            raise Forbidden("You are not allowed to access this resource.")
+        if status == 429:
+            raise RateLimited("The upload was rate limited.")
+        if status >= 500:
+            raise ServiceUnavailable(f"weeb.sh failed to store the upload ({status}).")
+        image = Image.parse(g.get("file", g), self)
+        if hasher is not None:
+            await self.upload_index.add(digest or hasher.hexdigest(), image.snowflake)
+        return image
+
+    async def _find_upload(self, digest: str):
+        snowflake = self.upload_index.get(digest)
+        if snowflake is None:
+            return None
+        try:
+            return await self.get_image(snowflake)
+        except ImageNotFound:
+            # Any other failure propagates, re-uploading during an outage would create the duplicate.
+            logger.debug(f"WEEB.SH Previously uploaded image {snowflake} is gone, uploading again")
+            await self.upload_index.discard(digest)
+            return None
+
+    async def iter_uploads(self, files, concurrency: int = 4, **options):
+        """
+        Uploads many images, yielding results as uploads finish.
+
+        This is an async generator, use it with ``async for``. At most ``concurrency`` uploads run at once.
+        A failed upload doesn't stop the others, its exception is yielded in place of the image.
+
+        Parameters
+        -----------
+        files:
+            Iterable of anything :meth:`upload` accepts as ``file``, or of :class:`dict` objects holding a
+            ``file`` key plus any per-file :meth:`upload` arguments.
+        **concurrency: :class:`int`
+            Maximum amount of concurrent uploads. Defaults to 4.
+        **options:
+            Arguments passed to :meth:`upload` for every file, for example ``base_type``.
+
+
+        :return: Yields ``(file, result)`` tuples, where result is an :class:`weebapi.data_objects.Image` or an
+            exception.
+        """
+        async for index, item, result in bounded_map(self._uploader(options), files, concurrency):
+            yield item, result
+
+    async def upload_many(self, files, concurrency: int = 4, **options) -> list:
+        """|coro|
+
+        Uploads many images with at most ``concurrency`` uploads running at once.
+
+        Takes the same arguments as :meth:`iter_uploads`.
+
+
+        :return: :class:`list` in the same order as ``files``. Each entry is an
+            :class:`weebapi.data_objects.Image` or, if that upload failed, the exception it raised.
+        """
+        results = {}
+        async for index, item, result in bounded_map(self._uploader(options), files, concurrency):
+            results[index] = result
+        return [results[i] for i in range(len(results))]
+
+    def _uploader(self, options: dict):
+        async def upload(item):
+            if isinstance(item, dict):
+                return await self.upload(**dict(options, **item))
+            return await self.upload(item, **options)
+        return upload
 
     async def get_preview(self, type_name: str, hidden: bool = False, nsfw: int = 1) -> Preview:
         """|coro|
@@ -150,6 +731,38 @@ class Client:
         :return: :class:`weebapi.data_objects.Preview`
 
         """
+        failure_key = (self.route.types.name, "preview", type_name, hidden, nsfw)
+        self._raise_remembered(failure_key)
+        previews = await self._preview_index(hidden, nsfw)
+        try:
+            return previews[type_name]
+        except KeyError:
+            error = NotFound("Preview does not exist.")
+            self._remember_failure(failure_key, error)
+            raise error
+
+    async def get_previews(self, hidden: bool = False, nsfw: int = 1) -> dict:
+        """|coro|
+
+        This function gets previews of all image types with a single request.
+
+        The result is kept in the same cache as :meth:`get_types`, so looking up previews of many image types
+        only costs one request per ``cache_ttl``.
+
+        Parameters
+        -----------
+        **hidden: :class:`bool`
+            Search in hidden image types. Defaults to False.
+        **nsfw: :class:`int`
+            Display options for NSFW content. Look for the valid values in :meth:`get_preview`.
+
+
+        :return: :class:`dict` of image type names mapped to :class:`weebapi.data_objects.Preview` objects.
+
+        """
+        return dict(await self._preview_index(hidden, nsfw))
+
+    async def _preview_index(self, hidden: bool, nsfw: int) -> dict:
         params = {"preview": "true"}
         if 1 <= nsfw <= 3:
             if nsfw == 1:
@@ -161,16 +774,20 @@ class Client:
             params.update({"nsfw": nsfw})
         if hidden:
             params.update({"hidden": "true"})
-        g = await self.request.get(str(self.route.types), params=params)
-        status = int(g.get("status", 200))
-        if status != 200 and status != 403:
-            raise NotFound("This resource does not exist or you are not allowed to access.")
-        elif status == 403:
-            raise Forbidden
-        for p in g["preview"]:
-            if p["type"] == type_name:
-                return Preview.parse(p, self)
-        raise NotFound("Preview does not exist.")
+
+        async def fetch():
+            g = await self.request.get(str(self.route.types), params=params, coalesce=True)
+            status = int(g.get("status", 200))
+            if status != 200 and status != 403:
+                raise NotFound("This resource does not exist or you are not allowed to access.")
+            elif status == 403:
+                raise Forbidden
+            return g
+
+        def build(g):
+            return {p["type"]: Preview.parse(p, self) for p in g["preview"]}
+
+        return await self._cached(("preview", hidden, params.get("nsfw")), fetch, build)
 
     async def get_types(self, hidden: bool = False, nsfw: int = 1) -> list:
         """|coro|
@@ -202,6 +819,9 @@ class Client:
 
         :return: Returns the list of :class:`weebapi.data_objects.ImageType` objects.
 
+        .. note::
+            Results are cached per ``hidden``/``nsfw`` combination, see ``cache_ttl`` on :class:`Client`.
+
         """
         params = {}
         if 1 <= nsfw <= 3:
@@ -214,13 +834,21 @@ class Client:
             params.update({"nsfw": nsfw})
         if hidden:
             params.update({"hidden": "true"})
-        g = await self.request.get(str(self.route.types), params=params)
-        status = int(g.get("status", 200))
-        if status != 200 and status != 403:
-            raise NotFound("This resource does not exist or you are not allowed to access.")
-        elif status == 403:
-            raise Forbidden
-        return [ImageType(t, self) for t in g['types']]
+
+        async def fetch():
+            g = await self.request.get(str(self.route.types), params=params, coalesce=True)
+            status = int(g.get("status", 200))
+            if status != 200 and status != 403:
+                raise NotFound("This resource does not exist or you are not allowed to access.")
+            elif status == 403:
+                raise Forbidden
+            return g
+
+        def build(g):
+            self.search_index.update(("types", hidden, params.get("nsfw")), "type", g['types'])
+            return [self.registry.image_type(t) for t in g['types']]
+
+        return list(await self._cached(("types", hidden, params.get("nsfw")), fetch, build))
 
     async def get_tags(self, hidden: bool = False, nsfw: int = 1) -> list:
         """|coro|
@@ -252,6 +880,9 @@ class Client:
 
         :return: Returns the list of :class:`weebapi.data_objects.Tag` objects.
 
+        .. note::
+            Results are cached per ``hidden``/``nsfw`` combination, see ``cache_ttl`` on :class:`Client`.
+
 
         """
         params = {}
@@ -265,13 +896,135 @@ class Client:
             params.update({"nsfw": nsfw})
         if hidden:
             params.update({"hidden": "true"})
-        g = await self.request.get(str(self.route.tags), params=params)
-        status = int(g.get("status", 200))
-        if status != 200 and status != 403:
-            raise NotFound("This resource does not exist or you are not allowed to access.")
-        elif status == 403:
-            raise Forbidden
-        return [Tag(t, self) for t in g['tags']]
+
+        async def fetch():
+            g = await self.request.get(str(self.route.tags), params=params, coalesce=True)
+            status = int(g.get("status", 200))
+            if status != 200 and status != 403:
+                raise NotFound("This resource does not exist or you are not allowed to access.")
+            elif status == 403:
+                raise Forbidden
+            return g
+
+        def build(g):
+            tags = [self.registry.tag(t) for t in g['tags']]
+            self.search_index.update(("tags", hidden, params.get("nsfw")), "tag", [t.name for t in tags])
+            return tags
+
+        return list(await self._cached(("tags", hidden, params.get("nsfw")), fetch, build))
+
+    async def get_nsfw_tag_names(self) -> frozenset:
+        """|coro|
+
+        This function gets the names of all NSFW (not safe for work) tags.
+
+        The set is kept in the same cache as :meth:`get_tags` and refreshed in the background once it is older
+        than ``cache_ttl``.
+
+
+        :return: :class:`frozenset` of tag names.
+
+        """
+        async def fetch():
+            g = await self.request.get(str(self.route.tags), params={"nsfw": "only"}, coalesce=True)
+            if g.get("status", 200) != 200:
+                raise Forbidden("You are not allowed to access this resource.")
+            return g
+
+        def build(g):
+            return frozenset(t["name"] for t in g["tags"])
+
+        return await self._cached(("nsfw_tag_names",), fetch, build)
+
+    async def _cached(self, key, fetch, build):
+        """Serves ``build(payload)`` from the metadata cache, warmed from and written through to the disk cache."""
+        async def fetch_and_build():
+            payload = await fetch()
+            built = self._built.get(key)
+            if built is not None and built[0] is payload:
+                # krequest got a 304 and handed back the previous payload, so the previous value still holds.
+                if self.persistent_cache is not None:
+                    await self.persistent_cache.touch(key)
+                return built[1]
+            value = build(payload)
+            self._built[key] = (payload, value)
+            if self.persistent_cache is not None:
+                await self.persistent_cache.store(key, payload)
+            return value
+
+        if self.persistent_cache is not None and self.metadata_cache.enabled and key not in self.metadata_cache:
+            stored = self.persistent_cache.load(key)
+            if stored is not None:
+                age, payload = stored
+                self.metadata_cache.set(key, build(payload), age=age)
+        return await self.metadata_cache.get_or_fetch(key, fetch_and_build)
+
+    async def classify_tags(self, tags) -> dict:
+        """|coro|
+
+        Checks which of the given tags are NSFW (not safe for work) in one pass over the cached NSFW tag set.
+
+        Parameters
+        -----------
+        tags:
+            Iterable of :class:`weebapi.data_objects.Tag` objects or tag names.
+
+
+        :return: :class:`dict` mapping every given tag to :class:`bool`.
+
+        """
+        names = await self.get_nsfw_tag_names()
+        return {tag: str(tag) in names for tag in tags}
+
+    async def classify_images(self, images) -> dict:
+        """|coro|
+
+        Checks which tags of the given images are NSFW (not safe for work) with a single fetch of the NSFW tag set.
+
+        Parameters
+        -----------
+        images:
+            Iterable of :class:`weebapi.data_objects.Image` objects.
+
+
+        :return: :class:`dict` of image IDs mapped to ``{tag: bool}`` dictionaries.
+
+        """
+        names = await self.get_nsfw_tag_names()
+        return {image.snowflake: {tag: tag.name in names for tag in image.tags} for image in images}
+
+    async def search(self, query: str, kind: str = None, limit: int = 25, max_distance: int = 2) -> list:
+        """|coro|
+
+        Searches tag and image type names, for example for command autocompletion.
+
+        Matching happens in memory against :attr:`search_index`, which is filled from every
+        :meth:`get_tags` and :meth:`get_types` result and updated whenever those are refreshed. If nothing
+        was fetched yet, the default lists are fetched first.
+
+        Exact matches are ranked first, then names starting with ``query``, names containing it and finally
+        names within ``max_distance`` edits.
+
+        Parameters
+        -----------
+        query: :class:`str`
+            What the user typed so far. Case is ignored.
+        **kind: :class:`str`
+            ``"tag"`` or ``"type"`` to search only one of them. Defaults to both.
+        **limit: :class:`int`
+            Maximum amount of results. Defaults to 25.
+        **max_distance: :class:`int`
+            Maximum edit distance of fuzzy matches, ``0`` disables them. Defaults to 2.
+
+
+        :return: :class:`list` of names, best match first.
+
+        """
+        if kind in (None, "tag") and ("tags", False, "false") not in self.search_index:
+            await self.get_tags()
+        if kind in (None, "type") and ("types", False, "false") not in self.search_index:
+            await self.get_types()
+        return self.search_index.search(query, kind=kind, max_distance=max_distance, limit=limit)
 
     async def get_random(self, tags: str or list = None, image_type: str = None, nsfw: int = 1,
                          hidden: bool = False, file_type: str = None) -> Image:
@@ -313,6 +1066,9 @@ class Client:
 
 
         :return: Returns the :class:`weebapi.data_objects.Image` object.
+
+        .. note::
+            With :meth:`enable_prefetch` images are usually served from a background-filled queue.
         """
         params = {}
         if tags:
@@ -341,5 +1097,64 @@ class Client:
                 params.update({"filetype": file_type})
             else:
                 raise ValueError("Invalid filetype. (Available: jpg, jpeg, png, gif)")
+        if self.prefetch is not None:
+            return await self.prefetch.get(params)
+        return await self._fetch_random(params)
+
+    async def _fetch_random(self, params: dict) -> Image:
+        failure_key = (self.route.random.name, tuple(sorted(params.items())))
+        self._raise_remembered(failure_key)
         g = await self.request.get(str(self.route.random), params=params)
-        return Image.parse(g, self)
+        return self._parse_image(g, failure_key)
+
+    def _parse_image(self, g: dict, failure_key) -> Image:
+        try:
+            return Image.parse(g, self)
+        except FileNotFoundError as e:
+            # Only a definite answer is remembered, errors left over after retries (5xx, 429) are not.
+            if int(g.get("status", 200)) not in NEGATIVE_STATUSES:
+                raise
+            error = ImageNotFound(*e.args)
+            self._remember_failure(failure_key, error)
+            raise error from None
+
+    def _raise_remembered(self, key):
+        """Raises the error ``key`` recently failed with, if the negative cache holds one."""
+        if self.negative_cache is not None:
+            failure = self.negative_cache.get(key)
+            if failure is not None:
+                # A fresh exception is raised on every hit, so tracebacks don't pile up on one shared instance.
+                raise failure[0](*failure[1])
+
+    def _remember_failure(self, key, error: Exception):
+        if self.negative_cache is not None:
+            self.negative_cache.set(key, (type(error), error.args))
+
+
+def _upload_form(file, base_type: str, hidden: bool, nsfw: bool, tags: list, source: str, filename: str,
+                 content_type: str) -> aiohttp.FormData:
+    form = aiohttp.FormData()
+    form.add_field("file", file, filename=filename or "image", content_type=content_type)
+    form.add_field("baseType", base_type)
+    form.add_field("hidden", "true" if hidden else "false")
+    form.add_field("nsfw", "true" if nsfw else "false")
+    if tags:
+        form.add_field("tags", ",".join(tags))
+    if source:
+        form.add_field("source", source)
+    return form
+
+
+def _merge_tag_operations(operations) -> dict:
+    """Merges ``(image, add, remove)`` operations into snowflakes mapped to ``(add, remove)`` lists."""
+    merged = {}
+    for image, add, remove in operations:
+        snowflake = image.snowflake if isinstance(image, Image) else image
+        adding, removing = merged.setdefault(snowflake, ({}, {}))
+        for name in remove or ():
+            adding.pop(name, None)
+            removing[name] = None
+        for name in add or ():
+            removing.pop(name, None)
+            adding[name] = None
+    return {snowflake: (list(adding), list(removing)) for snowflake, (adding, removing) in merged.items()}
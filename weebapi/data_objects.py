@@ -4,10 +4,27 @@ except ImportError:
     discord = None
 
 import contextlib
+import io
 import os
+import sys
+import weakref
 from .errors import *
 
 
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _image_type(name: str, client) -> "ImageType":
+    registry = getattr(client, "registry", None)
+    return registry.image_type(name) if registry is not None else ImageType(name, client)
+
+
+def _tag(data: dict, client) -> "Tag":
+    registry = getattr(client, "registry", None)
+    return registry.tag(data) if registry is not None else Tag(data, client)
+
+
 class Image:
     """Represents an image from Weeb.sh.
 
@@ -32,16 +49,18 @@ class Image:
     source: Optional[:class:`str`]
         Source of the image.
     tags: :class:`list`
-        List of `Tag` objects.
+        List of `Tag` objects. Built from the raw API data on first access.
     url: :class:`str`
         CDN URL of the image.
     """
+    __slots__ = ("client", "snowflake", "_type", "base_type", "nsfw", "file_type", "mime_type", "hidden", "account",
+                 "source", "_tags", "url")
 
     def __init__(self, snowflake: str, image_type: str, base_type: str, nsfw: bool, file_type: str, mime_type: str,
                  tags: list, url: str, hidden: bool, account: str, client, source: str = ""):
         self.client = client
         self.snowflake = snowflake
-        self.type = ImageType(image_type, self.client)
+        self._type = image_type
         self.base_type = base_type
         self.nsfw = nsfw
         self.file_type = file_type
@@ -49,12 +68,33 @@ class Image:
         self.hidden = hidden
         self.account = account
         self.source = source
-        self.tags = [Tag(t, self.client) for t in tags]
+        self._tags = tags
         self.url = url
 
     def __str__(self):
         return self.url
 
+    @property
+    def type(self):
+        if not isinstance(self._type, ImageType):
+            self._type = _image_type(self._type, self.client)
+        return self._type
+
+    @type.setter
+    def type(self, value):
+        self._type = value
+
+    @property
+    def tags(self) -> list:
+        tags = self._tags
+        if tags and not isinstance(tags[0], Tag):
+            tags = self._tags = [_tag(t, self.client) for t in tags]
+        return tags
+
+    @tags.setter
+    def tags(self, value: list):
+        self._tags = value
+
     @classmethod
     def parse(cls, response, client):
         status = response.get("status", 200)
@@ -69,6 +109,15 @@ class Image:
         else:
             return data
 
+    async def classify_tags(self) -> dict:
+        """|coro|
+
+        Checks which tags of this image are NSFW (not safe for work) with one lookup in the cached NSFW tag set.
+
+        :return: :class:`dict` of :class:`Tag` objects mapped to :class:`bool`.
+        """
+        return await self.client.classify_tags(self.tags)
+
     async def delete(self):
         """|coro|
 
@@ -80,9 +129,7 @@ class Image:
             If required permissions are absent.
 
         """
-        g = await self.client.request.delete(str(self.client.route.image_remove.format_url(self.snowflake)))
-        if g.get("status", 200) != 200:
-            raise Forbidden("You are not allowed to access this resource.")
+        await self.client._delete_image(self.snowflake)
 
     async def add_tags(self, tags: list):
         """|coro|
@@ -100,11 +147,7 @@ class Image:
             If required permissions are absent.
 
         """
-        g = await self.client.request.post(str(self.client.route.image_add_tags.format_url(self.snowflake)), data={
-            "tags": ",".join(tags)
-        })
-        if g.get("status", 200) != 200:
-            raise Forbidden("You are not allowed to access this resource.")
+        await self.client._add_tags(self.snowflake, tags)
 
     async def remove_tags(self, tags: list):
         """|coro|
@@ -122,12 +165,7 @@ class Image:
             If required permissions are absent.
 
         """
-        g = await self.client.request.delete(str(self.client.route.image_remove_tags.format_url(self.snowflake)),
-                                             params={
-                                                 "tags": ",".join(tags)
-                                             })
-        if int(g.get("status", 200)) != 200:
-            raise Forbidden("You are not allowed to access this resource.")
+        await self.client._remove_tags(self.snowflake, tags)
 
 
 class ImageType:
@@ -141,14 +179,28 @@ class ImageType:
             Returns the name of the image type.
 
 
+    Instances are immutable. Objects handed out by a client are shared through its :class:`ObjectRegistry`,
+    so equal image types are usually the same object.
+
     Attributes
     -------------
     name: :class:`str`
         Name of the image type.
     """
+    __slots__ = ("name", "client", "__weakref__")
+
     def __init__(self, name: str, client):
-        self.name = name
-        self.client = client
+        object.__setattr__(self, "name", _intern(name))
+        object.__setattr__(self, "client", client)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, ImageType) and self.name == other.name)
+
+    def __hash__(self):
+        return hash(self.name)
 
     def __str__(self):
         return self.name
@@ -164,14 +216,11 @@ class ImageType:
 
         :return: :class:`Preview`
         """
-        g = await self.client.request.get(str(self.client.route.types), params={
-            "nsfw": "true",
-            "preview": "true"
-        })
-        for p in g["preview"]:
-            if p["type"] == self.name:
-                return Preview.parse(p, self.client)
-        raise FileNotFoundError
+        previews = await self.client._preview_index(False, 2)
+        try:
+            return previews[self.name]
+        except KeyError:
+            raise FileNotFoundError
 
 
 class Preview:
@@ -198,14 +247,26 @@ class Preview:
     file_type: :class:`str`
         Image file type.
     """
+    __slots__ = ("client", "snowflake", "url", "_image_type", "base_type", "file_type")
+
     def __init__(self, snowflake: str, url: str, file_type: str, base_type: str, image_type: str, client):
         self.client = client
         self.snowflake = snowflake
         self.url = url
-        self.image_type = ImageType(image_type, self.client)
+        self._image_type = image_type
         self.base_type = base_type
         self.file_type = file_type
 
+    @property
+    def image_type(self):
+        if not isinstance(self._image_type, ImageType):
+            self._image_type = _image_type(self._image_type, self.client)
+        return self._image_type
+
+    @image_type.setter
+    def image_type(self, value):
+        self._image_type = value
+
     def __str__(self) -> str:
         return self.url
 
@@ -237,12 +298,30 @@ class Tag:
 
             By it self it returns the name of the tag.
 
+    Instances are immutable and compare equal if name, account and hidden flag match. Objects handed out by a
+    client are shared through its :class:`ObjectRegistry`, so equal tags are usually the same object.
+
     """
+    __slots__ = ("name", "account", "is_hidden", "client", "__weakref__")
+
     def __init__(self, tag: dict, client):
-        self.name = tag.get("name", "unknown")
-        self.account = tag.get("user", "unknown")
-        self.is_hidden = tag.get("hidden", False)
-        self.client = client
+        object.__setattr__(self, "name", _intern(tag.get("name", "unknown")))
+        object.__setattr__(self, "account", _intern(tag.get("user", "unknown")))
+        object.__setattr__(self, "is_hidden", tag.get("hidden", False))
+        object.__setattr__(self, "client", client)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+    @property
+    def key(self) -> tuple:
+        return self.name, self.account, self.is_hidden
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Tag) and self.key == other.key)
+
+    def __hash__(self):
+        return hash(self.key)
 
     def __str__(self) -> str:
         return self.name
@@ -256,27 +335,65 @@ class Tag:
 
         Checks if the tag is NSFW (not safe for work).
 
+        Uses the cached set from :meth:`weebapi.Client.get_nsfw_tag_names`. To check many tags at once use
+        :meth:`weebapi.Client.classify_tags`.
+
         :return: :class:`bool`
         """
-        g = await self.client.request.get(str(self.client.route.tags), params={"nsfw": "only"})
-        if g.get("status", 200) != 200:
-            raise Forbidden("You are not allowed to access this resource.")
-        if self.name in g["tags"]:
-            return True
-        else:
-            return False
+        return self.name in await self.client.get_nsfw_tag_names()
+
+
+class ObjectRegistry:
+    """
+    Per-client registry of shared :class:`Tag` and :class:`ImageType` objects.
+
+    Every tag and image type created by a :class:`weebapi.Client` goes through here, so each distinct one exists
+    only once and its strings are interned. Objects are held weakly and dropped once nothing uses them.
+    It is available as ``client.registry``.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._tags = weakref.WeakValueDictionary()
+        self._types = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._tags) + len(self._types)
+
+    def tag(self, data: dict) -> Tag:
+        """Returns the shared :class:`Tag` for raw tag data from the API."""
+        key = (data.get("name", "unknown"), data.get("user", "unknown"), data.get("hidden", False))
+        tag = self._tags.get(key)
+        if tag is None:
+            tag = self._tags[key] = Tag(data, self.client)
+        return tag
+
+    def image_type(self, name: str) -> ImageType:
+        """Returns the shared :class:`ImageType` with the given name."""
+        image_type = self._types.get(name)
+        if image_type is None:
+            image_type = self._types[name] = ImageType(name, self.client)
+        return image_type
 
 
 class ImageFile:
     """
     Represents a image file object usually retrieved from image generation.
 
+    The image is either stored in a file or, if it was generated in memory, held as :class:`bytes`.
+
     Attributes
     -----------
-    file_path: :class:`str`
-        Returns file path.
+    file_path: Optional[:class:`str`]
+        Returns file path, ``None`` for in-memory images.
+    data: Optional[:class:`bytes`]
+        Image content of in-memory images, ``None`` for images stored in a file.
+    filename: :class:`str`
+        Name used when uploading the image.
     discord_file: :class:`discord.File`
         If discord.py is installed it returns a :class:`discord.File` object, else raises an exception.
+        In-memory images are wrapped without copying, so the same image can be sent several times by accessing
+        this property again.
 
     Raises
     -------
@@ -284,19 +401,39 @@ class ImageFile:
         Raised if discord.py is not installed, but :class:`discord.File` object is requested.
 
     """
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str = None, data: bytes = None, filename: str = None):
         self.file_path = file_path
+        self.data = data
+        self.filename = filename or (os.path.basename(file_path) if file_path else "image.png")
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
 
     @property
     def discord_file(self):
         if discord:
+            if self.in_memory:
+                return discord.File(io.BytesIO(self.data), filename=self.filename)
             return discord.File(open(self.file_path, 'rb'))
         else:
             raise DiscordPyNotInstalled
 
+    def read(self) -> bytes:
+        """
+        Returns the image content as :class:`bytes`.
+        """
+        if self.in_memory:
+            return self.data
+        with open(self.file_path, 'rb') as f_handle:
+            return f_handle.read()
+
     def delete(self):
         """
-        This function deletes the file.
+        This function deletes the file, or releases the content of an in-memory image.
         """
+        if self.in_memory:
+            self.data = None
+            return
         with contextlib.suppress(FileNotFoundError):
             os.remove(self.file_path)
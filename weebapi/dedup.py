@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import time
+
+from .persistent import SQLiteStore
+
+
+class UploadIndex(SQLiteStore):
+    """
+    SQLite-backed map of file content hashes to the snowflakes of images uploaded with that content.
+
+    :meth:`weebapi.Client.upload` looks files up here before sending them, so importing the same files again
+    doesn't upload duplicates. See :class:`weebapi.persistent.SQLiteStore` for how reads and writes are done.
+
+    Parameters
+    -----------
+    path: :class:`str`
+        Path of the database file. It is created if missing.
+    """
+    description = "upload index"
+
+    def __init__(self, path: str):
+        super().__init__(path, "CREATE TABLE IF NOT EXISTS uploads "
+                               "(hash TEXT PRIMARY KEY, snowflake TEXT NOT NULL, uploaded_at REAL NOT NULL)")
+
+    def __len__(self):
+        row = self._read("SELECT COUNT(*) FROM uploads", ())
+        return row[0] if row is not None else 0
+
+    def get(self, digest: str):
+        """Returns the snowflake stored for ``digest``, or ``None``."""
+        row = self._read("SELECT snowflake FROM uploads WHERE hash = ?", (digest,))
+        return row[0] if row is not None else None
+
+    async def add(self, digest: str, snowflake: str):
+        """|coro|
+
+        Records that content with ``digest`` was uploaded as ``snowflake``.
+        """
+        await self._write("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?)", (digest, snowflake, time.time()))
+
+    async def discard(self, digest: str):
+        """|coro|
+
+        Forgets ``digest``, for example because its image was deleted.
+        """
+        await self._write("DELETE FROM uploads WHERE hash = ?", (digest,))
+
+
+class StreamHasher:
+    """
+    Computes the SHA-256 digest of content while it is read, hashing in the default executor.
+
+    Parameters
+    -----------
+    chunk_size: :class:`int`
+        Size in bytes of the chunks read from files.
+    """
+
+    def __init__(self, chunk_size: int = 64 * 1024):
+        self.chunk_size = chunk_size
+        self._hash = hashlib.sha256()
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    async def update(self, chunk: bytes):
+        # hashlib releases the GIL for large inputs, so big chunks don't hold up the event loop thread.
+        await asyncio.get_event_loop().run_in_executor(None, self._hash.update, chunk)
+
+    async def hash_file(self, handle) -> str:
+        """|coro|
+
+        Hashes a seekable binary file object from its current position and seeks back to it.
+        """
+        await asyncio.get_event_loop().run_in_executor(None, self._hash_file_sync, handle)
+        return self.hexdigest()
+
+    def _hash_file_sync(self, handle):
+        start = handle.tell()
+        try:
+            for chunk in iter(lambda: handle.read(self.chunk_size), b""):
+                self._hash.update(chunk)
+        finally:
+            handle.seek(start)
+
+    async def wrap(self, chunks):
+        """Yields the chunks of the async iterator ``chunks`` unchanged, hashing each of them."""
+        async for chunk in chunks:
+            await self.update(chunk)
+            yield chunk
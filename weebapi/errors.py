@@ -27,3 +27,15 @@ class DiscordPyNotInstalled(Exception):
 
 class NotFound(Exception):
     pass
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class RateLimited(Exception):
+    pass
+
+
+class ImageNotFound(FileNotFoundError):
+    pass
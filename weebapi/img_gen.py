@@ -1,14 +1,45 @@
+import json
 import os
 import tempfile
 import uuid
 
+from .cache import LRUCache
 from .data_objects import ImageFile
+from .sinks import FileSink
 
 
 class ImgGen:
-    def __init__(self, client):
+    def __init__(self, client, cache_bytes: int = 0, in_memory: bool = False):
         self.client = client
         self.http = self.client.request
+        self.cache = LRUCache(max_bytes=cache_bytes, name="img_gen",
+                              instrument=self.client.instrument) if cache_bytes else None
+        self.in_memory = in_memory
+
+    async def _generate(self, route, name: str, params: dict) -> ImageFile:
+        filename = os.path.join(tempfile.gettempdir(), f"img_gen_{name}_{uuid.uuid4()}.png")
+        if self.cache is None and not self.in_memory:
+            if route.method == "GET":
+                await self.http.download_get(str(route), filename, params=params)
+            else:
+                await self.http.download_post(str(route), filename, json=params)
+            return ImageFile(filename)
+
+        key = (route.name, json.dumps(params, sort_keys=True))
+        data = self.cache.get(key) if self.cache is not None else None
+        if data is None:
+            if route.method == "GET":
+                data = await self.http.download("GET", str(route), params=params)
+            else:
+                data = await self.http.download(route.method, str(route), json=params)
+            if self.cache is not None:
+                self.cache.set(key, data)
+        if self.in_memory:
+            return ImageFile(data=data, filename=os.path.basename(filename))
+        sink = FileSink(filename)
+        await sink.write(data)
+        await sink.close()
+        return ImageFile(filename)
 
     async def get_simple(self, img_type: str, face_color: str = None, hair_color: str = None) -> ImageFile:
         """|coro|
@@ -43,11 +74,7 @@ class ImgGen:
         if img_type == "awooo" and hair_color:
             params.update({"hair": hair_color})
 
-        filename = os.path.join(tempfile.gettempdir(), f"img_gen_simple_{uuid.uuid4()}.png")
-
-        r = await self.http.download_get(str(self.client.route.imggen_simple), filename, params=params)
-
-        return ImageFile(filename)
+        return await self._generate(self.client.route.imggen_simple, "simple", params)
 
     async def discord_status(self, status: str="online", avatar: str=None) -> ImageFile:
         """|coro|
@@ -80,11 +107,7 @@ class ImgGen:
         if avatar:
             params.update({"avatar": avatar})
 
-        filename = os.path.join(tempfile.gettempdir(), f"img_gen_status_{uuid.uuid4()}.png")
-
-        r = await self.http.download_get(str(self.client.route.imggen_status), filename, params=params)
-
-        return ImageFile(filename)
+        return await self._generate(self.client.route.imggen_status, "status", params)
 
     async def license(self, title: str, avatar: str, badges: list=[], widgets: list=[]) -> ImageFile:
         """|coro|
@@ -119,11 +142,7 @@ class ImgGen:
                 widgets = widgets[:3]
             params.update({"widgets": widgets})
 
-        filename = os.path.join(tempfile.gettempdir(), f"img_gen_spook_{uuid.uuid4()}.png")
-
-        r = await self.http.download_post(str(self.client.route.imggen_license), filename, json=params)
-
-        return ImageFile(filename)
+        return await self._generate(self.client.route.imggen_license, "spook", params)
 
     async def waifu_insult(self, avatar: str) -> ImageFile:
         """|coro|
@@ -143,11 +162,7 @@ class ImgGen:
             "avatar": avatar,
         }
 
-        filename = os.path.join(tempfile.gettempdir(), f"img_gen_waifu_{uuid.uuid4()}.png")
-
-        r = await self.http.download_post(str(self.client.route.imggen_waifu), filename, json=params)
-
-        return ImageFile(filename)
+        return await self._generate(self.client.route.imggen_waifu, "waifu", params)
 
     async def love(self, avatar1: str, avatar2: str) -> ImageFile:
         """|coro|
@@ -170,8 +185,4 @@ class ImgGen:
             "targetTwo": avatar2
         }
 
-        filename = os.path.join(tempfile.gettempdir(), f"img_gen_love_{uuid.uuid4()}.png")
-
-        r = await self.http.download_post(str(self.client.route.imggen_love), filename, json=params)
-
-        return ImageFile(filename)
+        return await self._generate(self.client.route.imggen_love, "love", params)
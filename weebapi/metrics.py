@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+
+logger = logging.getLogger()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class Instrument:
+    """
+    Dispatches instrumentation events to registered callbacks.
+
+    Callbacks are called as ``callback(event, data)`` where ``event`` is a :class:`str` and ``data`` a
+    :class:`dict`. These events are emitted:
+
+    .. describe:: request
+
+        After every HTTP request. ``data`` holds ``route``, ``method``, ``status`` (``None`` if the request
+        failed without a response), ``latency`` and ``queue_wait`` in seconds and ``bytes`` received.
+
+    .. describe:: cache
+
+        After every cache lookup. ``data`` holds ``cache`` (the cache name) and ``hit`` (:class:`bool`).
+
+    Exceptions raised by callbacks are logged and otherwise ignored.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+
+    def __bool__(self):
+        return bool(self.callbacks)
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def emit(self, event: str, **data):
+        for callback in self.callbacks:
+            try:
+                callback(event, data)
+            except Exception:
+                logger.exception(f"WEEB.SH Instrumentation callback {callback!r} failed")
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram, as used by Prometheus.
+
+    Parameters
+    -----------
+    buckets:
+        Sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates the ``q`` quantile by linear interpolation inside the matching bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics built from :class:`Instrument` events.
+
+    Register it with :meth:`weebapi.Client.enable_metrics` or ``instrument.add_callback(registry)``.
+    :meth:`render` returns the metrics in the Prometheus text exposition format.
+
+    Parameters
+    -----------
+    prefix: :class:`str`
+        Prefix of all metric names.
+    buckets:
+        Upper bounds of the latency histogram buckets in seconds.
+    """
+
+    def __init__(self, prefix: str = "weebapi", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.requests = {}
+        self.response_bytes = {}
+        self.latency = {}
+        self.queue_wait = {}
+        self.cache = {}
+
+    def __call__(self, event: str, data: dict):
+        if event == "request":
+            route = data["route"]
+            key = (route, data["method"], "error" if data["status"] is None else str(data["status"]))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.response_bytes[route] = self.response_bytes.get(route, 0) + (data.get("bytes") or 0)
+            self._histogram(self.latency, route).observe(data["latency"])
+            self._histogram(self.queue_wait, route).observe(data.get("queue_wait") or 0.0)
+        elif event == "cache":
+            key = (data["cache"], "hit" if data["hit"] else "miss")
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def _histogram(self, store: dict, route: str) -> Histogram:
+        try:
+            return store[route]
+        except KeyError:
+            histogram = store[route] = Histogram(self.buckets)
+            return histogram
+
+    def quantiles(self, route: str) -> dict:
+        """Returns the estimated p50, p95 and p99 latency of ``route`` in seconds."""
+        histogram = self.latency.get(route) or Histogram(self.buckets)
+        return {"p50": histogram.quantile(0.5), "p95": histogram.quantile(0.95), "p99": histogram.quantile(0.99)}
+
+    def errors(self, route: str) -> int:
+        """Returns the amount of requests on ``route`` that failed or got a 4xx/5xx status."""
+        return sum(count for (r, _, status), count in self.requests.items()
+                   if r == route and (status == "error" or int(status) >= 400))
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = [f"# TYPE {p}_requests_total counter"]
+        for (route, method, status), count in sorted(self.requests.items()):
+            lines.append(f'{p}_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+        lines.append(f"# TYPE {p}_response_bytes_total counter")
+        for route, count in sorted(self.response_bytes.items()):
+            lines.append(f'{p}_response_bytes_total{{route="{route}"}} {count}')
+        self._render_histograms(lines, f"{p}_request_duration_seconds", self.latency)
+        self._render_histograms(lines, f"{p}_queue_wait_seconds", self.queue_wait)
+        lines.append(f"# TYPE {p}_cache_lookups_total counter")
+        for (cache, result), count in sorted(self.cache.items()):
+            lines.append(f'{p}_cache_lookups_total{{cache="{cache}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines: list, name: str, store: dict):
+        lines.append(f"# TYPE {name} histogram")
+        for route, histogram in sorted(store.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{route="{route}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{route="{route}"}} {histogram.count}')
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger()
+
+
+class SQLiteStore:
+    """
+    Base of the SQLite-backed stores.
+
+    Reads are single primary-key lookups and run directly on their own connection. Writes run in the default
+    executor on a second connection, and the database uses WAL journaling so they never block reads. Several
+    processes, for example the shards of one bot, can share one file.
+
+    Parameters
+    -----------
+    path: :class:`str`
+        Path of the database file. It is created if missing.
+    schema: :class:`str`
+        ``CREATE TABLE IF NOT EXISTS`` statement of the table.
+    """
+    description = "SQLite store"
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._reader = self._connect()
+        self._writer = self._connect()
+        with self._writer:
+            self._writer.execute(schema)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _read(self, query: str, args: tuple):
+        """Returns the first row of ``query``, or ``None`` if there is none or the read failed."""
+        try:
+            return self._reader.execute(query, args).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"WEEB.SH Could not read {self.description} {self.path}: {e!r}")
+            return None
+
+    async def _write(self, query: str, args: tuple):
+        await asyncio.get_event_loop().run_in_executor(None, self._execute, query, args)
+
+    def _execute(self, query, args):
+        try:
+            with self._write_lock:
+                self._writer.execute(query, args)
+        except sqlite3.Error as e:
+            logger.warning(f"WEEB.SH Could not write {self.description} {self.path}: {e!r}")
+
+    def close(self):
+        self._reader.close()
+        with self._write_lock:
+            self._writer.close()
+
+
+class PersistentCache(SQLiteStore):
+    """
+    SQLite-backed store of raw API responses that survives restarts.
+
+    See :class:`SQLiteStore` for how reads and writes are done.
+
+    Parameters
+    -----------
+    path: :class:`str`
+        Path of the database file. It is created if missing.
+    ttl: :class:`float`
+        Seconds after which stored entries are ignored.
+    """
+    description = "persistent cache"
+
+    def __init__(self, path: str, ttl: float = 86400.0):
+        super().__init__(path, "CREATE TABLE IF NOT EXISTS entries "
+                               "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, payload TEXT NOT NULL)")
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(key) -> str:
+        return json.dumps(key) if not isinstance(key, str) else key
+
+    def load(self, key):
+        """
+        Returns ``(age, payload)`` for ``key``, or ``None`` if it is missing or older than ``ttl``.
+        """
+        row = self._read("SELECT stored_at, payload FROM entries WHERE key = ?", (self._key(key),))
+        if row is None:
+            return None
+        age = max(time.time() - row[0], 0.0)
+        if self.ttl and age >= self.ttl:
+            return None
+        return age, json.loads(row[1])
+
+    async def store(self, key, payload):
+        """|coro|
+
+        Stores the JSON-serializable ``payload`` under ``key``.
+        """
+        await self._write("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                          (self._key(key), time.time(), json.dumps(payload)))
+
+    async def touch(self, key):
+        """|coro|
+
+        Marks the entry for ``key`` as stored just now, without rewriting its payload.
+        """
+        await self._write("UPDATE entries SET stored_at = ? WHERE key = ?", (time.time(), self._key(key)))
+
+    async def delete(self, key):
+        """|coro|
+
+        Removes ``key`` from the store.
+        """
+        await self._write("DELETE FROM entries WHERE key = ?", (self._key(key),))
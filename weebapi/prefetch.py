@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger()
+
+
+class PrefetchPool:
+    """
+    Keeps a bounded queue of ready results per request and refills it in the background.
+
+    This is used by :meth:`weebapi.Client.get_random` once prefetching is enabled with
+    :meth:`weebapi.Client.enable_prefetch`.
+
+    Parameters
+    -----------
+    fetch:
+        Coroutine function that takes a params :class:`dict` and returns one result.
+    depth: :class:`int`
+        Maximum amount of results kept per key.
+    low_water: :class:`int`
+        A refill is started when a queue holds this many results or fewer.
+    concurrency: :class:`int`
+        Maximum amount of refill requests in flight across all keys.
+    idle_timeout: :class:`float`
+        Seconds after which an unused key and its queue are dropped.
+    instrument: :class:`weebapi.metrics.Instrument`
+        Receives a ``cache`` event named ``prefetch`` for every lookup.
+
+    Attributes
+    -----------
+    hits: :class:`int`
+        Amount of results served from a queue.
+    misses: :class:`int`
+        Amount of results that had to be fetched while the caller waited.
+    """
+
+    def __init__(self, fetch, depth: int = 10, low_water: int = 3, concurrency: int = 2,
+                 idle_timeout: float = 300.0, instrument=None):
+        if depth < 1:
+            raise ValueError("Depth must be at least 1!")
+        self.fetch = fetch
+        self.depth = depth
+        self.low_water = min(low_water, depth - 1)
+        self.concurrency = concurrency
+        self.idle_timeout = idle_timeout
+        self.instrument = instrument
+        self.hits = 0
+        self.misses = 0
+        self._queues = {}
+        self._last_used = {}
+        self._refills = {}
+        self._semaphore = None
+
+    @staticmethod
+    def key(params: dict) -> tuple:
+        return tuple(sorted(params.items()))
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current queue sizes."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "queued": {key: len(queue) for key, queue in self._queues.items()},
+        }
+
+    async def get(self, params: dict):
+        """|coro|
+
+        Returns a prefetched result for ``params`` or fetches one if the queue is empty.
+        """
+        key = self.key(params)
+        now = time.monotonic()
+        self._evict_idle(now)
+        self._last_used[key] = now
+        queue = self._queues.setdefault(key, collections.deque())
+        hit = bool(queue)
+        if self.instrument:
+            self.instrument.emit("cache", cache="prefetch", hit=hit)
+        if hit:
+            self.hits += 1
+            result = queue.popleft()
+        else:
+            self.misses += 1
+            result = await self.fetch(params)
+        if len(queue) <= self.low_water and key not in self._refills:
+            self._refills[key] = asyncio.ensure_future(self._refill(key, dict(params)))
+        return result
+
+    def close(self):
+        """Cancels all running refills and drops every queue."""
+        for task in self._refills.values():
+            task.cancel()
+        self._refills.clear()
+        self._queues.clear()
+        self._last_used.clear()
+
+    async def _refill(self, key, params):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while key in self._queues and len(self._queues[key]) < self.depth:
+                async with self._semaphore:
+                    result = await self.fetch(params)
+                queue = self._queues.get(key)
+                if queue is None:
+                    break
+                queue.append(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WEEB.SH Prefetch for {params} failed: {e!r}")
+        # Cancelled refills were already removed by whoever cancelled them.
+        self._refills.pop(key, None)
+
+    def _evict_idle(self, now: float):
+        if not self.idle_timeout:
+            return
+        for key in [k for k, used in self._last_used.items() if now - used > self.idle_timeout]:
+            self._queues.pop(key, None)
+            self._last_used.pop(key, None)
+            task = self._refills.pop(key, None)
+            if task is not None:
+                task.cancel()
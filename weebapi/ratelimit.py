@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger()
+
+
+class TokenBucket:
+    """
+    Async token bucket that also follows the quota reported by the API.
+
+    Parameters
+    -----------
+    rate: :class:`float`
+        Tokens added per second. ``None`` disables the local bucket, so only the reported quota is enforced.
+    capacity: :class:`float`
+        Maximum amount of tokens, i.e. the allowed burst. Defaults to ``rate``.
+    """
+
+    def __init__(self, rate: float = None, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else (rate or 0)
+        self.tokens = self.capacity
+        self.remaining = None
+        self.reset_at = 0.0
+        self._updated = time.monotonic()
+        self._lock = None
+
+    def delay(self, now: float = None) -> float:
+        """Returns seconds a caller would have to wait right now."""
+        now = time.monotonic() if now is None else now
+        wait = 0.0
+        if self.remaining is not None and self.remaining <= 0 and now < self.reset_at:
+            wait = self.reset_at - now
+        if self.rate:
+            tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / self.rate)
+        return wait
+
+    async def acquire(self):
+        """|coro|
+
+        Waits until a request may be sent and takes one token.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = self.delay()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            now = time.monotonic()
+            if self.rate:
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            if self.remaining is not None:
+                if now >= self.reset_at:
+                    self.remaining = None
+                else:
+                    self.remaining -= 1
+
+    def block(self, remaining: int, reset_after: float):
+        now = time.monotonic()
+        self.remaining = remaining
+        self.reset_at = now + max(reset_after, 0.0)
+
+
+class RateLimiter:
+    """
+    Global and per-route rate limiting for :class:`weebapi.request_lib.krequest`.
+
+    Every request waits on the global bucket and on the bucket of its route. The
+    ``X-RateLimit-Remaining``/``X-RateLimit-Reset`` and ``Retry-After`` headers are applied to the global bucket,
+    as weeb.sh counts the quota per token, or with ``quota_scope="route"`` to the bucket of the route. Once the
+    quota is used up callers are delayed until it resets instead of being sent to the API.
+
+    Parameters
+    -----------
+    rate: :class:`float`
+        Global requests per second. ``None`` means only the headers are followed.
+    burst: :class:`float`
+        Global burst size. Defaults to ``rate``.
+    route_rate: :class:`float`
+        Requests per second for each route. ``None`` means only the headers are followed.
+    route_burst: :class:`float`
+        Burst size for each route. Defaults to ``route_rate``.
+    quota_scope: :class:`str`
+        ``"global"`` if the quota reported in headers is shared by all routes, ``"route"`` if every route has its
+        own.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None, route_rate: float = None,
+                 route_burst: float = None, quota_scope: str = "global"):
+        if quota_scope not in ("global", "route"):
+            raise ValueError("quota_scope must be 'global' or 'route'!")
+        self.quota_scope = quota_scope
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.global_bucket = TokenBucket(rate, burst)
+        self.buckets = {}
+
+    def bucket(self, route: str) -> TokenBucket:
+        try:
+            return self.buckets[route]
+        except KeyError:
+            bucket = self.buckets[route] = TokenBucket(self.route_rate, self.route_burst)
+            return bucket
+
+    async def acquire(self, route: str) -> float:
+        """|coro|
+
+        Waits until a request on ``route`` may be sent.
+
+        :return: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        await self.global_bucket.acquire()
+        await self.bucket(route).acquire()
+        return time.monotonic() - start
+
+    def update(self, route: str, status: int, headers):
+        """
+        Updates the global bucket or, with a ``"route"`` quota scope, the bucket of ``route`` from response headers.
+
+        :return: :class:`bool` whether the response was rate limited.
+        """
+        limited = status == 429
+        reset_after = _parse_reset(headers.get("Retry-After")) if limited else None
+        if reset_after is None:
+            reset_after = _parse_reset(headers.get("X-RateLimit-Reset"))
+        remaining = headers.get("X-RateLimit-Remaining")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+        except ValueError:
+            remaining = None
+        if limited:
+            remaining = 0
+            if reset_after is None:
+                reset_after = 1.0
+            logger.warning(f"WEEB.SH Rate limited on {route}, retrying in {reset_after:.2f}s")
+        if remaining is not None and reset_after is not None:
+            bucket = self.global_bucket if self.quota_scope == "global" else self.bucket(route)
+            bucket.block(remaining, reset_after)
+        return limited
+
+
+def _parse_reset(value):
+    """Turns a reset header into seconds from now. Accepts a delay, a unix timestamp or one in milliseconds."""
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+    if value > 1e11:
+        return value / 1000 - time.time()
+    if value > 1e9:
+        return value - time.time()
+    return value
@@ -1,23 +1,60 @@
 # -*- coding: utf-8 -*-
 
+import json
 import logging
 import sys
-import traceback
+import time
 
 import aiohttp
 import asyncio
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from weebapi import __version__
+from .cache import LRUCache
 from .errors import *
+from .metrics import Instrument
+from .ratelimit import RateLimiter
+from .retry import CircuitBreaker, RetryPolicy
+from .sinks import BytesSink, FileSink
+from .tracing import RequestTrace, build_trace_config
 
 logger = logging.getLogger()
 
 
 class krequest(object):
-    def __init__(self, return_json=True, global_headers={}, loop=asyncio.get_event_loop(), **kwargs):
+    def __init__(self, return_json=True, global_headers={}, loop=None, limit=100, limit_per_host=0,
+                 keepalive_timeout=30.0, ttl_dns_cache=300, timeout=None, router=None, rate_limiter=None,
+                 rate_limit_retries=3, retry_policy=None, breaker_threshold=5, breaker_timeout=30.0, coalesce=True,
+                 chunk_size=64 * 1024, json_loads=None, instrument=None, tracer=None, conditional_cache_size=256,
+                 **kwargs):
         self.bot = kwargs.get("bot", None)
-        self.loop = loop
-        self.session = aiohttp.ClientSession(loop=self.loop)
+        self.router = router
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.rate_limit_retries = rate_limit_retries
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.breakers = {}
+        self.coalesce = coalesce
+        self._inflight = {}
+        self.chunk_size = chunk_size
+        self.json_loads = json_loads or (orjson.loads if orjson else json.loads)
+        self.instrument = instrument if instrument is not None else Instrument()
+        self.tracer = tracer
+        self.validators = LRUCache(maxsize=conditional_cache_size) if conditional_cache_size else None
+        self.connector_options = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": ttl_dns_cache,
+        }
+        self.timeout = timeout
+        self._session = None
+        self._session_loop = None
         self.headers = {
             "User-Agent": "{}WeebAPI.py/{} (Github: AndyTempel) KRequests/alpha "
                           "(Custom asynchronous HTTP client)".format(
@@ -33,91 +70,300 @@ class krequest(object):
 
         logger.debug(f"Here are global headers: {str(self.headers)}")
 
+    @property
+    def session(self):
+        """
+        The :class:`aiohttp.ClientSession` used for requests.
+
+        It is created on first use, on the loop that is running at that time, and re-created if that loop
+        has since been closed or the session was closed.
+        """
+        loop = asyncio.get_event_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            if self._session is not None and not self._session.closed:
+                self._discard_session()
+            connector = aiohttp.TCPConnector(**self.connector_options)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            trace_configs = [build_trace_config()] if self.tracer is not None else None
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=trace_configs)
+            self._session_loop = loop
+        return self._session
+
+    def _discard_session(self):
+        old_loop = self._session_loop
+        if old_loop.is_running():
+            # The previous loop runs in another thread, so the session can still be closed there.
+            logger.info("WEEB.SH Event loop changed, closing the HTTP session of the previous loop")
+            asyncio.run_coroutine_threadsafe(self._session.close(), old_loop)
+        else:
+            # Its connections can only be closed by their own loop, which is closed or idle, so all that's left is
+            # to point at the leak.
+            logger.warning("WEEB.SH Dropping an HTTP session whose event loop is no longer running, call "
+                           "Client.close() before switching or closing the loop")
+
+    async def close(self):
+        """|coro|
+
+        Closes the underlying session and all pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def _proc_resp(self, response):
-        logger.debug(f"Request {response.method}: {response.url}")
-        logger.debug(f"Response headers: {str(response.headers)}")
+        # Arguments are passed to the logger instead of formatted, so nothing is stringified unless DEBUG is on.
+        logger.debug("Request %s: %s", response.method, response.url)
+        logger.debug("Response headers: %s", response.headers)
         if self.return_json:
+            body = await response.read()
             try:
-                resp = await response.json()
-                logger.debug(f"Response content: {str(resp)}")
-                return resp
+                resp = self.json_loads(body)
             except Exception:
-                print(traceback.format_exc())
-                print(response)
-                resp = await response.text()
-                logger.debug(f"Response content: {str(resp)}")
+                logger.warning("WEEB.SH Could not decode response of %s %s", response.method, response.url,
+                               exc_info=True)
+                logger.debug("Response content: %r", body)
                 return {}
+            logger.debug("Response content: %s", resp)
+            return resp
         else:
             resp = await response.text()
-            logger.debug(f"Response content: {str(resp)}")
+            logger.debug("Response content: %s", resp)
             return resp
 
-    async def get(self, url, params=None, headers=None, verify=True):
+    def route_name(self, method, url):
+        """Returns the :class:`weebapi.router.Route` name of the URL, or its path if no route matches."""
+        if self.router is not None:
+            route = self.router.match(url, method)
+            if route is not None:
+                return route.name
+        return str(url).split("?", 1)[0]
+
+    def breaker(self, route):
+        try:
+            return self.breakers[route]
+        except KeyError:
+            breaker = self.breakers[route] = CircuitBreaker(self.breaker_threshold, self.breaker_timeout)
+            return breaker
+
+    def _call_tracer(self, hook, trace):
+        try:
+            getattr(self.tracer, hook)(trace)
+        except Exception:
+            logger.exception(f"WEEB.SH Tracer {hook} failed")
+
+    async def _send(self, method, url, handler, replayable=True, **kwargs):
+        route = self.route_name(method, url)
+        breaker = self.breaker(route)
+        limited_attempt = 0
+        attempt = 0
+        correlation_id = None
+        delay = 0
+        while True:
+            if delay:
+                await asyncio.sleep(delay)
+            breaker.before_request(route)
+            queue_wait = await self.rate_limiter.acquire(route)
+            start = time.monotonic()
+            response = None
+            trace = None
+            settled = False
+            if self.tracer is not None:
+                trace = RequestTrace(method, url, route, correlation_id, attempt=attempt + limited_attempt)
+                correlation_id = trace.correlation_id
+                kwargs["trace_request_ctx"] = trace
+                trace.mark("start")
+                self._call_tracer("on_request_start", trace)
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    if self.rate_limiter.update(route, response.status, response.headers) \
+                            and replayable and limited_attempt < self.rate_limit_retries:
+                        limited_attempt += 1
+                        delay = 0
+                        settled = True
+                        breaker.record_success()
+                        await response.release()
+                        continue
+                    settled = True
+                    if response.status in self.retry_policy.statuses:
+                        breaker.record_failure(route)
+                        if replayable and self.retry_policy.should_retry(method, attempt):
+                            await response.release()
+                            delay = self.retry_policy.backoff(attempt)
+                            attempt += 1
+                            logger.info(f"WEEB.SH {method} {route} returned {response.status}, "
+                                        f"retry {attempt} in {delay:.2f}s")
+                            continue
+                    else:
+                        breaker.record_success()
+                    r = await handler(response)
+                    await response.release()
+                    return r
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if trace is not None:
+                    trace.exception = e
+                settled = True
+                breaker.record_failure(route)
+                if not (replayable and self.retry_policy.should_retry(method, attempt)):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                attempt += 1
+                logger.info(f"WEEB.SH {method} {route} failed with {e!r}, retry {attempt} in {delay:.2f}s")
+            except Exception as e:
+                if trace is not None:
+                    trace.exception = e
+                raise
+            finally:
+                if not settled and breaker.state == breaker.HALF_OPEN:
+                    # The probe was cancelled or failed in an unexpected way, so the route isn't known to work.
+                    breaker.record_failure(route)
+                if trace is not None:
+                    trace.mark("end")
+                    trace.status = response.status if response is not None else None
+                    self._call_tracer("on_request_end", trace)
+                if self.instrument:
+                    self.instrument.emit(
+                        "request", route=route, method=method, status=response.status if response is not None else None,
+                        latency=time.monotonic() - start, queue_wait=queue_wait,
+                        bytes=getattr(response.content, "total_bytes", 0) if response is not None else 0)
+
+    async def get(self, url, params=None, headers=None, verify=True, coalesce=False):
         headers = headers or {}
         headers.update(self.headers)
-        async with self.session.get(url, params=params, headers=headers) as resp:
-                r = await self._proc_resp(resp)
-                await resp.release()
-                return r
+        if not (coalesce and self.coalesce):
+            return await self._conditional_get(url, params, headers)
+        # Identical concurrent GETs share one request, so the parsed result is shared too. Only idempotent
+        # lookups opt in; routes like random images must give every caller its own response.
+        key = ("GET", str(url), _canonical(params), _canonical(headers))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._conditional_get(url, params, headers))
+            self._inflight[key] = future
+
+            def done(f):
+                if self._inflight.get(key) is f:
+                    del self._inflight[key]
+            future.add_done_callback(done)
+        else:
+            logger.debug("Joined in-flight request GET %s", url)
+        return await asyncio.shield(future)
+
+    def forget_inflight(self, url):
+        """Makes later GETs of ``url`` send a new request instead of joining one that is already in flight."""
+        url = str(url)
+        for key in [key for key in self._inflight if key[1] == url]:
+            del self._inflight[key]
+
+    async def _conditional_get(self, url, params, headers):
+        if self.validators is None:
+            return await self._send("GET", url, self._proc_resp, params=params, headers=headers)
+        key = (str(url), _canonical(params))
+        cached = self.validators.get(key)
+        if cached is not None:
+            etag, last_modified, result = cached
+            headers = dict(headers)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        async def handler(response):
+            if response.status == 304 and cached is not None:
+                logger.debug("Not modified, reusing response of GET %s", url)
+                # The very same object is returned, so callers can tell nothing changed.
+                return cached[2]
+            r = await self._proc_resp(response)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.status == 200 and (etag or last_modified):
+                self.validators.set(key, (etag, last_modified, r))
+            return r
+
+        return await self._send("GET", url, handler, params=params, headers=headers)
 
     async def delete(self, url, params=None, headers=None, verify=True):
         headers = headers or {}
         headers.update(self.headers)
-        async with self.session.delete(url, params=params, headers=headers) as resp:
-                r = await self._proc_resp(resp)
-                await resp.release()
-                return r
+        return await self._send("DELETE", url, self._proc_resp, params=params, headers=headers)
 
     async def post(self, url, data=None, json=None, headers=None, verify=True):
         headers = headers or {}
         headers.update(self.headers)
-        if json is not None:
-            async with self.session.post(url, json=json, headers=headers) as resp:
-                r = await self._proc_resp(resp)
-                await resp.release()
-                return r
-        else:
-            async with self.session.post(url, data=data, headers=headers) as resp:
-                r = await self._proc_resp(resp)
-                await resp.release()
-                return r
+        return await self._send("POST", url, self._proc_resp, data=data, json=json, headers=headers)
 
-    async def download_get(self, url, filename, params=None, headers=None, verify=True):
+    async def post_stream(self, url, data, headers=None):
+        """|coro|
+
+        Sends a POST whose body can only be read once, such as a streamed multipart upload. It is never retried.
+
+        Raises
+        --------
+        RateLimited:
+            If the response status is 429. The rate limiter already waits out the reset before the next request,
+            so the caller may send a fresh body again.
+        """
         headers = headers or {}
         headers.update(self.headers)
-        async with self.session.get(url, params=params, headers=headers) as response:
+
+        async def handler(response):
+            if response.status == 429:
+                raise RateLimited(f"Rate limited on POST {url}")
+            return await self._proc_resp(response)
+        return await self._send("POST", url, handler, replayable=False, data=data, headers=headers)
+
+    async def stream(self, method, url, sink, params=None, data=None, json=None, headers=None):
+        """|coro|
+
+        Sends a request and streams the response body into ``sink`` in chunks of ``chunk_size`` bytes.
+
+        ``sink`` is a :class:`weebapi.sinks.Sink` or any object with ``async write(chunk)`` and ``async close()``
+        methods. :class:`weebapi.sinks.FileSink` and :class:`weebapi.sinks.BytesSink` are provided. Failed
+        attempts are only retried if the sink also has an ``async reset()`` method, which both provided ones do.
+
+        Raises
+        --------
+        Forbidden:
+            If the response status is not 200.
+        """
+        headers = headers or {}
+        headers.update(self.headers)
+        started = False
+
+        async def handler(response):
+            nonlocal started
+            # Checked before the sink is touched, so a FileSink doesn't leave an empty file behind.
             if response.status != 200:
                 raise Forbidden
-            with open(filename, 'wb') as f_handle:
-                while True:
-                    chunk = await response.content.read(1024)
-                    if not chunk:
-                        break
-                    f_handle.write(chunk)
-            await response.release()
+            if started:
+                # A previous attempt failed partway through the body.
+                await sink.reset()
+            started = True
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                await sink.write(chunk)
+
+        try:
+            await self._send(method, url, handler, replayable=hasattr(sink, "reset"), params=params, data=data,
+                             json=json, headers=headers)
+        finally:
+            if started:
+                await sink.close()
+        return sink
+
+    async def download(self, method, url, params=None, data=None, json=None, headers=None):
+        """|coro|
+
+        Sends a request and returns the response body as :class:`bytes`.
+        """
+        sink = await self.stream(method, url, BytesSink(), params=params, data=data, json=json, headers=headers)
+        return sink.getvalue()
+
+    async def download_get(self, url, filename, params=None, headers=None, verify=True):
+        await self.stream("GET", url, FileSink(filename), params=params, headers=headers)
 
     async def download_post(self, url, filename, data=None, json=None, headers=None, verify=True):
-        headers = headers or {}
-        headers.update(self.headers)
-        if json is not None:
-            async with self.session.post(url, json=json, headers=headers) as response:
-                if response.status != 200:
-                    raise Forbidden
-                with open(filename, 'wb') as f_handle:
-                    while True:
-                        chunk = await response.content.read(1024)
-                        if not chunk:
-                            break
-                        f_handle.write(chunk)
-                await response.release()
-        else:
-            async with self.session.post(url, data=data, headers=headers) as response:
-                if response.status != 200:
-                    raise Forbidden
-                with open(filename, 'wb') as f_handle:
-                    while True:
-                        chunk = await response.content.read(1024)
-                        if not chunk:
-                            break
-                        f_handle.write(chunk)
-                await response.release()
+        await self.stream("POST", url, FileSink(filename), data=data, json=json, headers=headers)
+
+
+def _canonical(mapping):
+    if not mapping:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in mapping.items()))
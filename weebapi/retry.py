@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+import time
+
+from .errors import ServiceUnavailable
+
+logger = logging.getLogger()
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait in between.
+
+    Waits use capped exponential backoff with full jitter: ``uniform(0, min(cap, base * 2 ** attempt))``.
+
+    Parameters
+    -----------
+    retries: :class:`int`
+        Maximum amount of retries per request. ``0`` disables retrying.
+    base: :class:`float`
+        Backoff of the first retry in seconds.
+    cap: :class:`float`
+        Maximum backoff in seconds.
+    statuses:
+        HTTP status codes that are retried.
+    methods:
+        HTTP methods that are safe to retry.
+    """
+
+    def __init__(self, retries: int = 3, base: float = 0.5, cap: float = 10.0,
+                 statuses=(500, 502, 503, 504), methods=("GET", "HEAD", "PUT", "DELETE")):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(methods)
+
+    def should_retry(self, method: str, attempt: int) -> bool:
+        return attempt < self.retries and method in self.methods
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Per-route circuit breaker.
+
+    After ``threshold`` consecutive failures the circuit opens and requests fail immediately with
+    :class:`weebapi.errors.ServiceUnavailable`. Once ``recovery_timeout`` has passed a single probe request
+    is let through; if it succeeds the circuit closes again, otherwise it stays open for another period. If the
+    probe never reports back, for example because it was cancelled, another one is let through after
+    ``recovery_timeout``.
+
+    Parameters
+    -----------
+    threshold: :class:`int`
+        Consecutive failures that open the circuit. ``0`` disables the breaker.
+    recovery_timeout: :class:`float`
+        Seconds to wait before probing an open circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold: int = 5, recovery_timeout: float = 30.0):
+        self.threshold = threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def before_request(self, route: str):
+        """Raises :class:`weebapi.errors.ServiceUnavailable` if the request must not be sent."""
+        if self.state == self.CLOSED:
+            return
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            logger.info(f"WEEB.SH Probing {route} after circuit breaker timeout")
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return
+        raise ServiceUnavailable(f"Circuit breaker for {route} is open, weeb.sh seems to be down.")
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self, route: str):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.threshold and self.failures >= self.threshold):
+            if self.state != self.OPEN:
+                logger.warning(f"WEEB.SH Circuit breaker for {route} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
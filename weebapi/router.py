@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
+import re
 
 from weebapi.errors import RequireFormatting
 
 
 class Route(object):
-    def __init__(self, url: str, method: str, require_format: bool = False):
+    def __init__(self, url: str, method: str, require_format: bool = False, name: str = None):
         self.url = url
         self.method = method
         self.require_format = require_format
+        self.name = name or url
+        self.pattern = re.compile(re.escape(url).replace(re.escape("{}"), "[^/]+") + "$")
 
     def __str__(self) -> str:
         if self.require_format:
@@ -46,3 +49,17 @@ class Router(object):
         self.imggen_license = Route(self.base_imggen + "license", "POST")
         self.imggen_waifu = Route(self.base_imggen + "waifu-insult", "POST")
         self.imggen_love = Route(self.base_imggen + "love-ship", "POST")
+
+        self.routes = []
+        for name, route in vars(self).items():
+            if isinstance(route, Route):
+                route.name = name
+                self.routes.append(route)
+
+    def match(self, url: str, method: str) -> Route:
+        """Returns the :class:`Route` a formatted URL belongs to, or ``None``."""
+        url = str(url).split("?", 1)[0]
+        for route in self.routes:
+            if route.method == method and route.pattern.match(url):
+                return route
+        return None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import bisect
+
+
+class SearchIndex:
+    """
+    Local index of tag and image type names for prefix and fuzzy search.
+
+    Names are kept in a sorted array of case-folded keys, so a prefix lookup is a binary search followed by a
+    short scan. For fuzzy matching every key is also stored under all strings obtained by deleting up to
+    ``max_distance`` characters from it; two names within that edit distance always share one of those, so
+    a lookup only has to verify a handful of candidates.
+
+    Names are added per source (for example one ``get_tags`` result) with :meth:`update`, which only inserts
+    and removes the names that changed since the last update of that source.
+
+    Parameters
+    -----------
+    max_distance: :class:`int`
+        Largest edit distance fuzzy lookups support.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._keys = []
+        self._entries = {}
+        self._sources = {}
+        self._deletes = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, source):
+        return source in self._sources
+
+    def update(self, source, kind: str, names):
+        """
+        Replaces the names contributed by ``source``.
+
+        Parameters
+        -----------
+        source:
+            Any hashable identifying where the names came from.
+        kind: :class:`str`
+            ``"tag"`` or ``"type"``.
+        names:
+            Iterable of names.
+        """
+        new = {(name, kind) for name in names}
+        old = self._sources.get(source, set())
+        self._sources[source] = new
+        for entry in old - new:
+            self._remove(entry)
+        for entry in new - old:
+            self._add(entry)
+
+    def _add(self, entry):
+        key = (entry[0].casefold(), entry[1], entry[0])
+        count = self._entries.get(key, 0)
+        if not count:
+            bisect.insort(self._keys, key)
+            for variant in _deletions(key[0], self.max_distance):
+                self._deletes.setdefault(variant, set()).add(key)
+        self._entries[key] = count + 1
+
+    def _remove(self, entry):
+        key = (entry[0].casefold(), entry[1], entry[0])
+        count = self._entries.get(key, 0) - 1
+        if count > 0:
+            self._entries[key] = count
+            return
+        self._entries.pop(key, None)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+        for variant in _deletions(key[0], self.max_distance):
+            keys = self._deletes.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._deletes[variant]
+
+    def prefix(self, query: str, kind: str = None, limit: int = 25) -> list:
+        """Returns names starting with ``query``, ignoring case, in alphabetical order."""
+        query = query.casefold()
+        results = []
+        for i in range(bisect.bisect_left(self._keys, (query,)), len(self._keys)):
+            key, key_kind, name = self._keys[i]
+            if not key.startswith(query) or len(results) >= limit:
+                break
+            if kind is None or key_kind == kind:
+                results.append(name)
+        return results
+
+    def fuzzy(self, query: str, kind: str = None, max_distance: int = 2, limit: int = 25) -> list:
+        """
+        Returns names within ``max_distance`` edits of ``query``, closest first.
+
+        Insertions, deletions, substitutions and swaps of adjacent characters count as one edit each.
+        ``max_distance`` is capped at the ``max_distance`` of the index.
+        """
+        query = query.casefold()
+        max_distance = min(max_distance, self.max_distance)
+        candidates = set()
+        for variant in _deletions(query, max_distance):
+            candidates.update(self._deletes.get(variant, ()))
+        scored = []
+        for key, key_kind, name in candidates:
+            if kind is not None and key_kind != kind:
+                continue
+            distance = _bounded_distance(query, key, max_distance)
+            if distance is not None:
+                scored.append((distance, key, name))
+        scored.sort()
+        return [name for _, _, name in scored[:limit]]
+
+    def search(self, query: str, kind: str = None, max_distance: int = 2, limit: int = 25) -> list:
+        """
+        Returns names matching ``query``, best first.
+
+        Exact matches come first, then prefix matches (shorter first), then names containing ``query`` and
+        finally fuzzy matches by edit distance. Fuzzy matching allows one edit per three typed characters, up to
+        ``max_distance``, so short queries don't match everything.
+        """
+        folded = query.casefold()
+        max_distance = min(max_distance, len(folded) // 3)
+        ranked = {}
+        for name in self.prefix(folded, kind, limit=len(self._keys)):
+            ranked[name] = (0 if name.casefold() == folded else 1, len(name))
+        if len(ranked) < limit:
+            for key, key_kind, name in self._keys:
+                if name not in ranked and folded in key and (kind is None or key_kind == kind):
+                    ranked[name] = (2, len(name))
+        if len(ranked) < limit and max_distance:
+            for name in self.fuzzy(folded, kind, max_distance, limit):
+                if name not in ranked:
+                    ranked[name] = (3, _bounded_distance(folded, name.casefold(), max_distance))
+        return sorted(ranked, key=lambda n: (ranked[n], n))[:limit]
+
+
+def _deletions(word: str, depth: int) -> set:
+    """Returns ``word`` and every string made by deleting up to ``depth`` characters from it."""
+    result = {word}
+    edge = {word}
+    for _ in range(depth):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))}
+        result |= edge
+    return result
+
+
+def _bounded_distance(a: str, b: str, bound: int):
+    """Edit distance of ``a`` and ``b`` counting adjacent swaps as one edit, or ``None`` if it exceeds ``bound``."""
+    if abs(len(a) - len(b)) > bound:
+        return None
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > bound:
+            return None
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= bound else None
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import io
+
+
+class Sink:
+    """
+    Target of a streamed download, see :meth:`weebapi.request_lib.krequest.stream`.
+
+    Subclass it, or pass any object with the same two coroutine methods. Sinks that can discard what was
+    written also define ``async reset()``; only downloads into those are retried after a failure midway.
+    """
+
+    async def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class BytesSink(Sink):
+    """
+    Collects a download in memory. The content is available from :meth:`getvalue` after the download.
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    async def write(self, chunk: bytes):
+        self._buffer.write(chunk)
+
+    async def reset(self):
+        self._buffer = io.BytesIO()
+
+    def getvalue(self) -> bytes:
+        return self._buffer.getvalue()
+
+
+class FileSink(Sink):
+    """
+    Writes a download to a file without blocking the event loop.
+
+    Chunks are collected until ``buffer_size`` bytes are pending and then written in the default executor,
+    so small files end up as a single write.
+
+    Parameters
+    -----------
+    filename: :class:`str`
+        Path of the file. It is created or truncated on the first write.
+    buffer_size: :class:`int`
+        Amount of bytes collected before they are written out.
+    """
+
+    def __init__(self, filename: str, buffer_size: int = 1024 * 1024):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self._pending = []
+        self._pending_size = 0
+        self._handle = None
+
+    async def write(self, chunk: bytes):
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+        if self._pending_size >= self.buffer_size:
+            await self._flush()
+
+    async def reset(self):
+        self._pending = []
+        self._pending_size = 0
+        if self._handle is not None:
+            await asyncio.get_event_loop().run_in_executor(None, self._truncate_sync)
+
+    def _truncate_sync(self):
+        self._handle.seek(0)
+        self._handle.truncate()
+
+    async def close(self):
+        await self._flush()
+        if self._handle is not None:
+            await asyncio.get_event_loop().run_in_executor(None, self._handle.close)
+            self._handle = None
+
+    async def _flush(self):
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        await asyncio.get_event_loop().run_in_executor(None, self._write_sync, data)
+
+    def _write_sync(self, data: bytes):
+        if self._handle is None:
+            self._handle = open(self.filename, 'wb')
+        if data:
+            self._handle.write(data)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+import uuid
+
+import aiohttp
+
+logger = logging.getLogger()
+
+
+class RequestTrace:
+    """
+    Timestamps of one HTTP request, filled in by aiohttp's tracing signals.
+
+    Attributes
+    -----------
+    correlation_id: :class:`str`
+        ID shared by all attempts of one logical request, including retries.
+    attempt: :class:`int`
+        Attempt number, starting at ``0``.
+    method: :class:`str`
+        HTTP method.
+    url: :class:`str`
+        Requested URL.
+    route: :class:`str`
+        :class:`weebapi.router.Route` name of the request.
+    status: Optional[:class:`int`]
+        Response status, ``None`` until headers arrived or if the request failed.
+    exception: Optional[:class:`Exception`]
+        Exception the request failed with.
+    reused_connection: :class:`bool`
+        Whether a pooled keep-alive connection was used.
+    dns_cache_hit: Optional[:class:`bool`]
+        Whether the host was resolved from aiohttp's DNS cache. ``None`` if no lookup was needed.
+    timestamps: :class:`dict`
+        Raw :func:`time.monotonic` timestamps by event name.
+    """
+
+    def __init__(self, method: str, url: str, route: str, correlation_id: str = None, attempt: int = 0):
+        self.correlation_id = correlation_id or uuid.uuid4().hex
+        self.attempt = attempt
+        self.method = method
+        self.url = str(url)
+        self.route = route
+        self.status = None
+        self.exception = None
+        self.reused_connection = False
+        self.dns_cache_hit = None
+        self.timestamps = {}
+
+    def mark(self, event: str):
+        self.timestamps[event] = time.monotonic()
+
+    def _span(self, start: str, end: str):
+        if start in self.timestamps and end in self.timestamps:
+            return self.timestamps[end] - self.timestamps[start]
+        return None
+
+    @property
+    def phases(self) -> dict:
+        """
+        Phase durations in seconds, ``None`` for phases that did not happen.
+
+        ``queue`` is the wait for a free pooled connection, ``dns`` the host lookup, ``connect`` the TCP and
+        TLS handshake (aiohttp reports them as one step), ``ttfb`` the time from having a connection to
+        receiving response headers, ``transfer`` the time spent reading the body and ``total`` everything.
+        """
+        connected = "connection_create_end" if "connection_create_end" in self.timestamps else "connection_reused"
+        return {
+            "queue": self._span("connection_queued_start", "connection_queued_end"),
+            "dns": self._span("dns_resolvehost_start", "dns_resolvehost_end"),
+            "connect": self._span("connection_create_start", "connection_create_end"),
+            "ttfb": self._span(connected, "request_end"),
+            "transfer": self._span("request_end", "end"),
+            "total": self._span("start", "end"),
+        }
+
+
+class Tracer:
+    """
+    Receives a :class:`RequestTrace` for every request attempt made by :class:`weebapi.request_lib.krequest`.
+
+    Subclass it and pass it as ``tracer`` to :class:`weebapi.Client`, for example to turn traces into
+    OpenTelemetry spans. Both hooks are called on the event loop and should return quickly.
+    """
+
+    def on_request_start(self, trace: RequestTrace):
+        pass
+
+    def on_request_end(self, trace: RequestTrace):
+        pass
+
+
+def _marker(event: str):
+    async def handler(session, context, params):
+        trace = context.trace_request_ctx
+        if isinstance(trace, RequestTrace):
+            trace.mark(event)
+    return handler
+
+
+async def _on_request_end(session, context, params):
+    trace = context.trace_request_ctx
+    if isinstance(trace, RequestTrace):
+        trace.mark("request_end")
+        trace.status = params.response.status
+
+
+async def _on_reuseconn(session, context, params):
+    trace = context.trace_request_ctx
+    if isinstance(trace, RequestTrace):
+        trace.mark("connection_reused")
+        trace.reused_connection = True
+
+
+def _on_dns_cache(hit: bool):
+    async def handler(session, context, params):
+        trace = context.trace_request_ctx
+        if isinstance(trace, RequestTrace):
+            trace.dns_cache_hit = hit
+    return handler
+
+
+def build_trace_config() -> aiohttp.TraceConfig:
+    """Returns a :class:`aiohttp.TraceConfig` that records phase timestamps into :class:`RequestTrace`."""
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_marker("request_start"))
+    config.on_request_end.append(_on_request_end)
+    config.on_connection_queued_start.append(_marker("connection_queued_start"))
+    config.on_connection_queued_end.append(_marker("connection_queued_end"))
+    config.on_connection_create_start.append(_marker("connection_create_start"))
+    config.on_connection_create_end.append(_marker("connection_create_end"))
+    config.on_connection_reuseconn.append(_on_reuseconn)
+    config.on_dns_resolvehost_start.append(_marker("dns_resolvehost_start"))
+    config.on_dns_resolvehost_end.append(_marker("dns_resolvehost_end"))
+    config.on_dns_cache_hit.append(_on_dns_cache(True))
+    config.on_dns_cache_miss.append(_on_dns_cache(False))
+    return config